@@ -0,0 +1,214 @@
+"""Images used by the game, decoded once and kept in memory.
+
+'AssetCache' serves every image from memory after it has been decoded for
+the first time. Files can be read in advance by a background thread, so that
+nothing has to be read when the images are needed, e.g. at game over.
+Animations are stored in sprite sheets - one PNG file with all the distinct
+frames placed one under another and a JSON file describing where the frames
+are and in which order they are played. Sprite sheet is made from separate
+images by:
+    python assets.py sheet.png frame_0.png frame_1.png ...
+"""
+
+import base64
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+
+import tkinter
+
+
+class UnsupportedImageError(Exception): pass
+
+
+class AssetCache:
+    """Cache of 'tkinter.PhotoImage' objects of files in [directory]."""
+
+    def __init__(self, directory=os.path.dirname(os.path.abspath(__file__))):
+        self.directory = directory
+        self._images = {}       # Name of the file: decoded image
+        self._frames = {}       # Name of the sprite sheet: list of frames
+        self._data = {}         # Name of the file: prefetched base64 data
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def image(self, name):
+        """Returns image of the file [name], which is decoded only once."""
+        image = self._images.get(name)
+        if image is None:
+            with self._lock:
+                data = self._data.pop(name, None)
+            if data is None:
+                image = tkinter.PhotoImage(file=self.path(name))
+            else:
+                image = tkinter.PhotoImage(data=data)
+            self._images[name] = image
+        return image
+
+    def frames(self, name):
+        """Returns list of frames of the animation in the sprite sheet [name]
+        in the order they are played, see 'pack_sprite_sheet'."""
+        frames = self._frames.get(name)
+        if frames is None:
+            with open(self.path(name + '.json')) as file:
+                layout = json.load(file)
+            sheet = self.image(name)
+            distinct = []
+            for x, y, width, height in layout['frames']:
+                frame = tkinter.PhotoImage(width=width, height=height)
+                frame.tk.call(frame, 'copy', sheet, '-from', x, y,
+                              x + width, y + height, '-to', 0, 0)
+                distinct.append(frame)
+            frames = self._frames[name] = [distinct[index]
+                                           for index in layout['order']]
+        return frames
+
+    def prefetch(self, names, widget=None):
+        """Reads files [names] by a background thread. If [widget] is given,
+        images are decoded as well - one at a time, when tkinter is idle."""
+
+        def read():
+            for name in names:
+                if name in self._images:
+                    continue
+                with open(self.path(name), 'rb') as file:
+                    data = base64.b64encode(file.read())
+                with self._lock:
+                    self._data[name] = data
+
+        thread = threading.Thread(target=read, daemon=True)
+        thread.start()
+        if widget is None:
+            return
+
+        def decode():
+            with self._lock:
+                for name in names:
+                    if name in self._images:
+                        # Decoded from the file meanwhile, before its data
+                        # have been read
+                        self._data.pop(name, None)
+                ready = [name for name in names if name in self._data]
+            if ready:
+                self.image(ready[0])
+            if ready[1:] or thread.is_alive():
+                widget.after(10, decode)
+
+        widget.after_idle(decode)
+
+
+# Cache shared by the whole program
+cache = AssetCache()
+
+
+def read_png(filename):
+    """Returns width, height and list of rows (bytes, 4 per pixel) of
+    an 8-bit RGBA PNG file [filename]."""
+
+    with open(filename, 'rb') as file:
+        data = file.read()
+    if data[:8] != b'\x89PNG\r\n\x1a\n':
+        raise UnsupportedImageError(f"{filename} is not a PNG file.")
+    offset = 8
+    idat = []
+    while offset < len(data):
+        length, type = struct.unpack_from('>I4s', data, offset)
+        chunk = data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+        if type == b'IHDR':
+            (width, height, depth, color_type, compression, filter,
+             interlace) = struct.unpack('>IIBBBBB', chunk)
+            if (depth, color_type, interlace) != (8, 6, 0):
+                message = f"{filename} is not a non-interlaced RGBA image."
+                raise UnsupportedImageError(message)
+        elif type == b'IDAT':
+            idat.append(chunk)
+
+    raw = zlib.decompress(b''.join(idat))
+    stride = width * 4
+    rows = []
+    previous = bytearray(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        filter = raw[start]
+        row = bytearray(raw[start + 1:start + 1 + stride])
+        for i in range(stride):
+            left = row[i - 4] if i >= 4 else 0
+            up = previous[i]
+            if filter == 1:
+                row[i] = (row[i] + left) & 0xff
+            elif filter == 2:
+                row[i] = (row[i] + up) & 0xff
+            elif filter == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xff
+            elif filter == 4:
+                up_left = previous[i - 4] if i >= 4 else 0
+                # Paeth predictor
+                estimate = left + up - up_left
+                to_left = abs(estimate - left)
+                to_up = abs(estimate - up)
+                to_up_left = abs(estimate - up_left)
+                if to_left <= to_up and to_left <= to_up_left:
+                    predictor = left
+                elif to_up <= to_up_left:
+                    predictor = up
+                else:
+                    predictor = up_left
+                row[i] = (row[i] + predictor) & 0xff
+        rows.append(bytes(row))
+        previous = row
+    return width, height, rows
+
+
+def write_png(filename, width, rows):
+    """Writes 8-bit RGBA image with [rows] (bytes, 4 per pixel, [width]
+    pixels) into PNG file [filename]. Rows are filtered by 'Sub' filter."""
+
+    def chunk(type, data):
+        return (struct.pack('>I', len(data)) + type + data
+                + struct.pack('>I', zlib.crc32(type + data)))
+
+    raw = bytearray()
+    for row in rows:
+        raw.append(1)
+        raw += bytes(row[i] - (row[i - 4] if i >= 4 else 0) & 0xff
+                     for i in range(len(row)))
+    header = struct.pack('>IIBBBBB', width, len(rows), 8, 6, 0, 0, 0)
+    with open(filename, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+                   + chunk(b'IDAT', zlib.compress(bytes(raw), 9))
+                   + chunk(b'IEND', b''))
+
+
+def pack_sprite_sheet(output, filenames):
+    """Packs images [filenames] (frames of an animation in the order they are
+    played) into sprite sheet [output] and its layout into [output].json.
+    Identical frames are stored only once."""
+
+    images = []         # (width, height, rows) of distinct frames
+    order = []
+    for filename in filenames:
+        image = read_png(filename)
+        if image not in images:
+            images.append(image)
+        order.append(images.index(image))
+
+    sheet_width = max(width for width, height, rows in images)
+    sheet_rows = []
+    frames = []
+    for width, height, rows in images:
+        frames.append([0, len(sheet_rows), width, height])
+        padding = bytes(4 * (sheet_width - width))
+        sheet_rows += [row + padding for row in rows]
+    write_png(output, sheet_width, sheet_rows)
+    with open(output + '.json', 'w') as file:
+        json.dump({'frames': frames, 'order': order}, file)
+
+
+if __name__ == '__main__':
+    pack_sprite_sheet(sys.argv[1], sys.argv[2:])
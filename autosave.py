@@ -0,0 +1,128 @@
+"""Periodic saving of a displayed game, which does not hold the game up.
+
+Only a snapshot of the game is taken in the thread of tkinter (see module
+'snapshot'), which shares unchanged parts with the last snapshot taken after
+a time step, so it takes microseconds. A worker thread turns it into a saved
+game (see module 'savefile') and writes it into a temporary file, which
+replaces the autosave only when it is complete - a crash never leaves
+a half-written autosave. Older autosaves are kept as well:
+    autosave.tet, autosave.1.tet, ..., autosave.<keep - 1>.tet
+from the newest one."""
+
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+import engine
+import savefile
+
+
+class Autosaver:
+    """Saves the [game] ('game.Game') every [interval] seconds into
+    [directory] keeping [keep] last saves. Games are saved in the binary
+    format or in the text one, if [binary] is False."""
+
+    def __init__(self, game, directory, interval=30, keep=5, binary=True,
+                 name='autosave'):
+        self.game = game
+        self.directory = directory
+        self.interval = interval
+        self.keep = max(1, keep)
+        self.binary = binary
+        self.name = name
+        self.last_snapshot = None
+        self.capture_time = 0   # Time the last capture took [ns]
+        self.saves = 0          # Number of finished saves
+        self.cycle = None
+        # Snapshots waiting to be saved, a save is skipped if the previous
+        # one has not been written yet
+        self.queue = queue.Queue(maxsize=1)
+        self.worker = threading.Thread(target=self.write_all, daemon=True)
+        self.worker.start()
+
+    def filename(self, index):
+        """Returns path of the [index]-th newest autosave."""
+        suffix = '' if index == 0 else f'.{index}'
+        return os.path.join(self.directory, f'{self.name}{suffix}.tet')
+
+    def start(self):
+        """Starts saving periodically."""
+        self.cycle = self.game.canvas.after(int(self.interval * 1000),
+                                            self.autosave)
+
+    def stop(self):
+        if self.cycle is not None:
+            self.game.canvas.after_cancel(self.cycle)
+            self.cycle = None
+
+    def autosave(self):
+        self.save()
+        self.start()
+
+    def save(self):
+        """Captures the game and lets the worker save it. Nothing is saved if
+        the game has not changed since the last save."""
+        start = time.perf_counter_ns()
+        snapshots = self.game.snapshots.snapshots
+        previous = snapshots[-1] if snapshots else self.last_snapshot
+        snapshot = self.game.snapshot(previous)
+        self.capture_time = time.perf_counter_ns() - start
+        if snapshot == self.last_snapshot:
+            return
+        try:
+            self.queue.put_nowait(snapshot)
+            self.last_snapshot = snapshot
+        except queue.Full:
+            pass
+
+    def close(self):
+        """Stops saving and waits until the last capture is written."""
+        self.stop()
+        self.queue.join()
+
+    def write_all(self):
+        """Writes snapshots from the queue. Runs in the worker thread."""
+        game = None     # Headless engine serializing snapshots
+        while True:
+            snapshot = self.queue.get()
+            try:
+                no_rows, no_columns = snapshot.size
+                if game is None or (game.no_rows, game.no_columns) != (
+                        no_rows, no_columns):
+                    game = engine.Engine(no_rows, no_columns)
+                game.restore(snapshot)
+                if self.binary:
+                    data = savefile.dumps(game)
+                else:
+                    data = savefile.dumps_text(game).encode()
+                self.write(data)
+                self.saves += 1
+            except Exception as error:
+                # The worker has to keep running, or the next capture would
+                # never be taken from the queue and 'close' would never return
+                print(f"Autosave failed: {error!r}", file=sys.stderr)
+            finally:
+                self.queue.task_done()
+
+    def write(self, data):
+        """Writes [data] into a temporary file, shifts older autosaves and
+        renames the file to the newest autosave."""
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory,
+                                                 prefix=self.name,
+                                                 suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            for index in range(self.keep - 1, 0, -1):
+                if os.path.exists(self.filename(index - 1)):
+                    os.replace(self.filename(index - 1), self.filename(index))
+            os.replace(temporary, self.filename(0))
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
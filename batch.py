@@ -0,0 +1,207 @@
+import numpy as np
+
+import shape as shp
+import engine
+
+
+shape_types = engine.Engine.shape_types
+# Points for 1, 2, 3 and 4 lines deleted at once, see 'Engine.add_points'
+points_factor = np.array([0, 40, 100, 300, 1200], dtype=np.int64)
+
+
+def piece_tables(j0=6):
+    """Returns two arrays describing all shape types, indexed as in
+    'shape_types':
+    - cells of every orientation, shape (7, 4, 4, 2) - (row, column) offsets
+      of four squares from the upper left corner of the shape's bounding box,
+      orientations with fewer distinct states ('I', 'O') repeat cyclically,
+    - spawning positions of squares as in 'Shape.__init__' with left column
+      of the spawning box [j0], shape (7, 4, 2)."""
+
+    cells = np.zeros((len(shape_types), 4, 4, 2), dtype=np.int64)
+    spawn = np.zeros((len(shape_types), 4, 2), dtype=np.int64)
+    for t, type in enumerate(shape_types):
+        shape_orientations = shp.orientations[type]
+        for orientation in range(4):
+            positions = shape_orientations[orientation
+                                           % len(shape_orientations)]
+            min_row = min(row for row, column in positions)
+            min_column = min(column for row, column in positions)
+            cells[t, orientation] = shp.Shape.shift_positions(positions,
+                                                              -min_row,
+                                                              -min_column)
+        spawn[t] = sorted(shp.Shape(type, j0=j0).coords)
+    return cells, spawn
+
+
+class BatchEngine:
+    """Simulates many games at once, each of them on its own board.
+    All the boards are held in one NumPy array and every step places, drops
+    and locks active shapes, detects full lines and compacts rows on all the
+    boards at once by array operations.
+
+    Shapes are placed by a policy, which chooses an orientation and a column
+    for every board, and fall straight down from where they spawn. Deleted
+    lines are compacted classically - rows above them move down by the number
+    of deleted lines - as by 'engine.Engine' with the gravity mode 'naive',
+    not the default one, where separated parts of shapes fall independently.
+    Points, deleted lines, level and delay are updated the same way as by
+    'Engine.add_points'."""
+
+    hidden_rows = 2     # Rows above the visible area, where shapes spawn
+
+    def __init__(self, n, no_rows=20, no_columns=15, seed=None):
+        self.n = n
+        self.no_rows = no_rows
+        self.no_columns = no_columns
+        self.rng = np.random.default_rng(seed)
+        # Shapes spawn in the middle of the board, as in 'Engine'
+        self.cells, spawn = piece_tables(min(no_columns // 2 - 1,
+                                             no_columns - 4))
+        # Spawning positions in array coordinates (hidden rows included)
+        self.spawn = spawn + np.array([BatchEngine.hidden_rows, 0])
+
+        height = no_rows + BatchEngine.hidden_rows
+        # 0 - free block, 1 to 7 - block occupied by a square of a shape of
+        # the type shape_types[code - 1]
+        self.boards = np.zeros((n, height, no_columns), dtype=np.uint8)
+        self.active_type = np.zeros(n, dtype=np.int64)
+        self.next_type = np.zeros(n, dtype=np.int64)
+        self.points = np.zeros(n, dtype=np.int64)
+        self.deleted_lines = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.delay = np.full(n, 500, dtype=np.int64)
+        # Highest occupied row of every column (height, if column is empty)
+        self.tops = np.full((n, no_columns), height, dtype=np.int64)
+        self.is_game_over = np.zeros(n, dtype=bool)
+        self.reset()
+
+    def reset(self, mask=None):
+        """Starts new games on boards selected by boolean [mask] (all boards,
+        if it is None)."""
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        count = int(mask.sum())
+        self.boards[mask] = 0
+        self.tops[mask] = self.boards.shape[1]
+        self.active_type[mask] = self.rng.integers(len(shape_types), size=count)
+        self.next_type[mask] = self.rng.integers(len(shape_types), size=count)
+        self.points[mask] = 0
+        self.deleted_lines[mask] = 0
+        self.level[mask] = 1
+        self.delay[mask] = 500
+        self.is_game_over[mask] = False
+
+    def step(self, orientations, columns):
+        """Places active shape of every running game in orientation
+        [orientations] (number of rotations from the spawning one) with its
+        leftmost square in column [columns], drops it, erases full lines and
+        spawns the next shape. Columns are clipped, so that shapes fit
+        the board. Games, whose shape can not be placed or spawned, are over.
+        Returns array with number of deleted lines on every board."""
+
+        boards = self.boards
+        running = ~self.is_game_over
+        height = boards.shape[1]
+
+        # Cells of the active shapes, shape (n, 4) for both rows and columns
+        orientations = np.asarray(orientations) % 4
+        cells = self.cells[self.active_type, orientations]
+        d_rows = cells[:, :, 0]
+        d_columns = cells[:, :, 1]
+        widths = d_columns.max(axis=1) + 1
+        columns = np.clip(columns, 0, self.no_columns - widths)
+        cell_columns = columns[:, None] + d_columns
+
+        # Shape falls until one of its squares lands on the top of a column
+        tops_below = np.take_along_axis(self.tops, cell_columns, axis=1)
+        drop = (tops_below - 1 - d_rows).min(axis=1)
+        # That holds only if the shape starts above the tops. Otherwise it can
+        # pass under an overhang, so it falls block by block (rare, as it can
+        # happen only in the hidden rows).
+        slow = np.nonzero(running & (d_rows >= tops_below).any(axis=1))[0]
+        if len(slow):
+            drop[slow] = self.fall(slow, d_rows[slow], cell_columns[slow])
+        placed = running & (drop >= 0)
+        self.is_game_over |= running & ~placed
+
+        # Locking shapes
+        index = np.nonzero(placed)[0]
+        cell_rows = drop[index, None] + d_rows[index]
+        cell_columns = cell_columns[index]
+        codes = (self.active_type[index] + 1).astype(np.uint8)
+        boards[index[:, None], cell_rows, cell_columns] = codes[:, None]
+        np.minimum.at(self.tops, (np.repeat(index, 4), cell_columns.ravel()),
+                      cell_rows.ravel())
+
+        # Detecting full lines - only rows of just locked shapes can be full
+        touched_full = (boards[index[:, None], cell_rows] != 0).all(axis=2)
+        touched_full &= cell_rows >= BatchEngine.hidden_rows
+        lines = np.zeros(self.n, dtype=np.int64)
+        full = np.zeros(boards.shape[:2], dtype=bool)
+        full[index[:, None], cell_rows] = touched_full
+        lines[index] = full[index].sum(axis=1)
+
+        # Erasing full lines
+        cleared = np.nonzero(lines)[0]
+        if len(cleared):
+            # Stable sort moves full rows to the top and keeps order of others
+            order = np.argsort(~full[cleared], axis=1, kind='stable')
+            compacted = np.take_along_axis(boards[cleared], order[:, :, None],
+                                           axis=1)
+            rows = np.arange(height)
+            compacted[rows[None, :] < lines[cleared, None]] = 0
+            boards[cleared] = compacted
+            self.update_tops(cleared)
+            self.add_points(cleared, lines[cleared])
+
+        # Spawning next shapes
+        self.active_type[index] = self.next_type[index]
+        self.next_type[index] = self.rng.integers(len(shape_types),
+                                                  size=len(index))
+        # As in 'Engine.time_step', game is over if new shape can not fall
+        spawn = self.spawn[self.active_type[index]]
+        blocked = boards[index[:, None], spawn[:, :, 0] + 1,
+                         spawn[:, :, 1]].any(axis=1)
+        self.is_game_over[index[blocked]] = True
+        return lines
+
+    def fall(self, index, d_rows, cell_columns):
+        """Returns how many blocks shapes with squares at ([d_rows],
+        [cell_columns]) fall on boards [index], when they fall one block after
+        another. Shapes, which can not be placed at all, get -1."""
+        boards = self.boards[index]
+        height = boards.shape[1]
+        drop = np.full(len(index), -1, dtype=np.int64)
+        falling = np.ones(len(index), dtype=bool)
+        local = np.arange(len(index))[:, None]
+        for d in range(height):
+            rows = d + d_rows
+            inside = (rows < height).all(axis=1)
+            rows = np.minimum(rows, height - 1)
+            free = inside & (boards[local, rows, cell_columns] == 0).all(axis=1)
+            falling &= free
+            if not falling.any():
+                break
+            drop[falling] = d
+        return drop
+
+    def update_tops(self, index=None):
+        """Recomputes highest occupied rows of columns of boards [index] (all
+        boards, if it is None). Needed after 'boards' are changed directly."""
+        if index is None:
+            index = np.arange(self.n)
+        occupied = self.boards[index] != 0
+        self.tops[index] = np.where(occupied.any(axis=1),
+                                    occupied.argmax(axis=1),
+                                    self.boards.shape[1])
+
+    def add_points(self, index, no_deleted_lines):
+        """Updates number of deleted lines, points, level and delay of boards
+        [index] as 'Engine.add_points' does."""
+
+        self.deleted_lines[index] += no_deleted_lines
+        self.points[index] += points_factor[no_deleted_lines] * self.level[index]
+        level_up = index[self.deleted_lines[index] % 10 == 0]
+        self.level[level_up] += 1
+        self.delay[level_up] = np.rint(self.delay[level_up] * 0.8)
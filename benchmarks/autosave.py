@@ -0,0 +1,61 @@
+"""Time autosave ('autosave') takes in the thread of the game - capturing
+a snapshot when locked shapes have or have not changed since the last one -
+compared to writing it in the worker thread, on boards of various sizes.
+Run from the repository root: python -m benchmarks.autosave"""
+
+import os
+import statistics
+import tempfile
+import time
+
+import engine
+import savefile
+from benchmarks import boards
+
+
+# (rows, columns) of boards filled up to three quarters
+board_sizes = [(20, 15), (50, 30), (100, 50), (200, 100)]
+
+
+def median_time(function, number=20):
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, 'autosave.tet')
+    print(f"{'board':>8} {'pieces':>6} {'unchanged [us]':>15} "
+          f"{'changed [us]':>13} {'worker [us]':>12}")
+    for no_rows, no_columns in board_sizes:
+        game = boards.synthetic_engine(no_rows * 3 // 4,
+                                       no_rows * no_columns // 8,
+                                       no_rows=no_rows, no_columns=no_columns,
+                                       active='T')
+        previous = game.snapshot()
+        unchanged = median_time(lambda: game.snapshot(previous))
+
+        def changed():
+            # As if a shape has locked since the previous snapshot
+            game.board.version += 1
+            game.snapshot(previous)
+
+        worker = engine.Engine(no_rows, no_columns)
+
+        def write():
+            worker.restore(previous)
+            with open(filename, 'wb') as file:
+                file.write(savefile.dumps(worker))
+
+        pieces = len(game.board.piece_cells())
+        print(f"{no_rows:>4}x{no_columns:<3} {pieces:>6} "
+              f"{unchanged * 1e6:>15.1f} {median_time(changed) * 1e6:>13.1f} "
+              f"{median_time(write, 5) * 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
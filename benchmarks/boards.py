@@ -0,0 +1,47 @@
+import random
+
+import shape as shp
+import engine
+
+
+def synthetic_engine(height, fragments, seed=0, no_rows=20, no_columns=15,
+                     full_rows=0, active=None):
+    """Returns a headless engine with a stack of [height] rows, where every
+    row misses one block, so that no line is full, except of [full_rows]
+    bottom rows, which are full. Squares of the stack belong to about
+    [fragments] pieces - horizontal runs of squares, as they remain after
+    shapes are divided by erasing lines.
+    Active shape is of the type [active] or a random one, if it is None."""
+
+    rnd = random.Random(seed)
+    game = engine.Engine(no_rows, no_columns)
+    game.clear()
+
+    cells = []
+    for row in range(no_rows - height, no_rows):
+        gap = rnd.randrange(no_columns)
+        if row >= no_rows - full_rows:
+            gap = None
+        cells += [(row, column) for column in range(no_columns)
+                  if column != gap]
+    # Splitting cells into runs of random length
+    run_length = max(1, len(cells) // max(1, fragments))
+    index = 0
+    while index < len(cells):
+        length = rnd.randint(1, 2 * run_length - 1)
+        run = [cells[index]]
+        for row, column in cells[index + 1:index + length]:
+            if row != run[0][0]:
+                break
+            run.append((row, column))
+        index += len(run)
+
+        type = rnd.choice(game.shape_types)
+        game.board.lock(run, shp.type_codes[type])
+
+    if active is None:
+        game.start()
+    else:
+        game.active_shape = game.new_shape(active)
+        game.choose_next_shape()
+    return game
@@ -0,0 +1,131 @@
+"""Microbenchmarks of hot paths of the engine on synthetic boards.
+Runs without a display and writes results as JSON, so that results of two
+versions can be compared.
+Run from the repository root:
+    python -m benchmarks.engine_paths [--output results.json] [--repeat 7]"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+import engine
+from benchmarks import boards
+
+
+# (stack height, number of fragments) of synthetic boards, see
+# 'boards.synthetic_engine'
+board_sizes = [(0, 0), (5, 10), (5, 35), (10, 20), (10, 70), (19, 38),
+               (19, 133)]
+# Shape falling in the active area during benchmarks of movements
+active_type = 'T'
+
+
+def measure(function, repeat, setup=None, number=None):
+    """Times [function] and returns minimum and median time of one call in
+    microseconds. If [setup] is given, it is called before every single call
+    (untimed) and its result is passed to the function, which is useful when
+    the function changes the game."""
+
+    if setup is None:
+        timer = timeit.Timer(function)
+        if number is None:
+            number, _ = timer.autorange()
+        times = [t / number for t in timer.repeat(repeat, number)]
+    else:
+        times = []
+        for _ in range(repeat * (number or 1)):
+            argument = setup()
+            start = time.perf_counter()
+            function(argument)
+            times.append(time.perf_counter() - start)
+    return {'min_us': min(times) * 1e6,
+            'median_us': statistics.median(times) * 1e6,
+            'runs': len(times)}
+
+
+def lowered(height, fragments):
+    """Returns synthetic engine, whose active shape has fallen as low as it can
+    without landing, so that it has room to rotate."""
+    game = boards.synthetic_engine(height, fragments, active=active_type)
+    distance = game.active_shape.drop_distance(game.board)
+    game.active_shape.shift(max(0, distance - 1), 0)
+    return game
+
+
+def benchmark_board(height, fragments, repeat, directory):
+    """Returns list of results of all benchmarks for one synthetic board."""
+
+    results = []
+
+    def add(name, result):
+        result.update(name=name, height=height, fragments=fragments)
+        results.append(result)
+
+    game = lowered(height, fragments)
+    shape = game.active_shape
+    board = game.board
+    add('Shape.can_move',
+        measure(lambda: shape.can_move('<down>', board), repeat))
+    new_positions = [(row, column + 1) for row, column in shape.coords]
+    add('Shape.can_move_to',
+        measure(lambda: shape.can_move_to(new_positions, board), repeat))
+    # Four rotations return the shape to its original orientation
+    add('Shape.test_and_rotate',
+        measure(lambda: shape.test_and_rotate(board), repeat, number=4))
+
+    # Benchmarks changing the game get a fresh one every call
+    add('Engine.hard_drop',
+        measure(lambda game: game.press('space'), repeat, number=20,
+                setup=lambda: boards.synthetic_engine(height, fragments,
+                                                      active=active_type)))
+    if height:
+        full_rows = min(4, height)
+        add(f'Engine.erase_full_lines[{full_rows}]',
+            measure(lambda game: game.erase_full_lines(), repeat, number=20,
+                    setup=lambda: boards.synthetic_engine(
+                        height, fragments, full_rows=full_rows,
+                        active=active_type)))
+
+    loaded = engine.Engine()
+    for format, binary in ('binary', True), ('text', False):
+        filename = os.path.join(directory, f'{height}-{fragments}.{format}')
+        add(f'Engine.save[{format}]',
+            measure(lambda: game.save(filename, binary), repeat))
+        add(f'Engine.load[{format}]',
+            measure(lambda: loaded.load(filename), repeat))
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help="JSON file (default: stdout)")
+    parser.add_argument('--repeat', type=int, default=7,
+                        help="number of measurements of every benchmark")
+    args = parser.parse_args(args)
+
+    directory = tempfile.mkdtemp()
+    results = []
+    for height, fragments in board_sizes:
+        results += benchmark_board(height, fragments, args.repeat, directory)
+        print(f"board {height}/{fragments} done", file=sys.stderr)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'results': results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Memory taken by synthetic boards - their locked squares and the active
+shape - and time of access to positions ('Square.row', 'Shape.coords',
+'Board.piece_cells', ...). Writes JSON.
+Run from the repository root:
+    python -m benchmarks.objects [--output results.json] [--repeat 7]"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks import boards
+from benchmarks.engine_paths import board_sizes, measure
+
+
+def memory(height, fragments, number=20):
+    """Returns number of bytes allocated per synthetic board, number of its
+    pieces and locked squares. Boards are built [number] times, so that
+    allocations not belonging to them (caches, interned numbers) are
+    negligible."""
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    games = [boards.synthetic_engine(height, fragments, active='T')
+             for _ in range(number)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    board = games[0].board
+    return {'bytes_per_board': (end - start) / number,
+            'pieces': len(board.piece_cells()),
+            'squares': len(board.colors) - board.colors.count(0)}
+
+
+def access(height, fragments, repeat):
+    """Returns times of reading positions of squares, shapes and pieces."""
+    game = boards.synthetic_engine(height, fragments, active='T')
+    active = game.active_shape
+    square = next(iter(active.squares))
+
+    def moved_coords():
+        # Cache of the moved shape has to be built again
+        active.shift(0, 1)
+        active.shift(0, -1)
+        active.coords
+
+    return {'square_row': measure(lambda: square.row, repeat),
+            'square_coords': measure(lambda: square.coords, repeat),
+            'shape_coords': measure(lambda: active.coords, repeat),
+            'shape_squares': measure(lambda: active.squares, repeat),
+            'board_piece_cells': measure(game.board.piece_cells, repeat),
+            'shift_there_and_back': measure(moved_coords, repeat)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help="JSON file (default: stdout)")
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args(args)
+
+    results = []
+    for height, fragments in board_sizes:
+        result = {'height': height, 'fragments': fragments}
+        result.update(memory(height, fragments))
+        result['access'] = access(height, fragments, args.repeat)
+        results.append(result)
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'boards': results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Throughput of the offscreen rasterizer ('raster') - frames per second of
+rendering single frames and batches, of encoding them into PNG and of
+the whole batch export of saved games and replay frames by a pool of
+processes. Writes JSON.
+Run from the repository root:
+    python -m benchmarks.raster [--frames 2000] [--processes 1 4]
+        [--output results.json]"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import engine
+import raster
+import replay
+from benchmarks import boards
+from benchmarks.engine_paths import measure
+
+
+# Sizes of squares - as in the game window and as in thumbnails
+block_sizes = [30, 10]
+batch_sizes = [1, 16, 64]
+
+
+def frames_per_second(median_us, frames=1):
+    return frames * 1e6 / median_us
+
+
+def rendering(block_size, repeat):
+    """Returns times of rendering and encoding a board half full."""
+    game = boards.synthetic_engine(10, 20, active='T')
+    rasterizer = raster.Rasterizer(block_size=block_size)
+    codes = rasterizer.codes(game)
+    image = rasterizer.render_codes(codes)
+    result = {'block_size': block_size,
+              'image': [rasterizer.width, rasterizer.height],
+              'codes': measure(lambda: rasterizer.codes(game), repeat)}
+    for batch in batch_sizes:
+        stack = np.stack([codes] * batch)
+        times = measure(lambda: rasterizer.render_codes(stack), repeat)
+        times['fps'] = frames_per_second(times['median_us'], batch)
+        result[f'render[{batch}]'] = times
+    for level in 1, 6:
+        times = measure(lambda: raster.png_bytes(image, level), repeat)
+        times['fps'] = frames_per_second(times['median_us'])
+        times['bytes'] = len(raster.png_bytes(image, level))
+        result[f'png[{level}]'] = times
+    return result
+
+
+def record(filename, frames, seed=0):
+    """Records a game with random keys, which has about [frames] frames."""
+    game = engine.Engine(seed=seed)
+    generator = random.Random(seed)
+    recorder = replay.Recorder(filename)
+    recorder.start(game)
+    for _ in range(frames // 2):
+        if game.is_game_over:
+            game.new_game(seed)
+            recorder.record('new', seed)
+        key = generator.choice(['Left', 'Right', 'Up', 'space'])
+        game.press(key)
+        recorder.record('key', key)
+        game.time_step()
+        recorder.record('tick')
+    recorder.close()
+
+
+def export(directory, frames, processes, block_size):
+    """Returns frames per second of exporting saved games and replay frames
+    into PNG files and replay frames into a raw stream."""
+    games = []
+    for index in range(frames // 10):
+        game = boards.synthetic_engine(index % 19, index % 19 * 3, seed=index)
+        filename = os.path.join(directory, f'game{index}.tet')
+        game.save(filename)
+        games.append(filename)
+    log = os.path.join(directory, 'game.log')
+    record(log, frames)
+    output = os.path.join(directory, 'output')
+    os.makedirs(output, exist_ok=True)
+
+    start = time.perf_counter()
+    raster.render_files(games, output, block_size, processes)
+    files_time = time.perf_counter() - start
+    start = time.perf_counter()
+    count = raster.render_replays([log], output, block_size=block_size,
+                                  processes=processes)
+    replay_time = time.perf_counter() - start
+    start = time.perf_counter()
+    with open(os.devnull, 'wb') as file:
+        raster.render_replays_raw([log], file, block_size=block_size)
+    raw_time = time.perf_counter() - start
+    return {'processes': processes, 'block_size': block_size,
+            'files': len(games), 'files_fps': len(games) / files_time,
+            'replay_frames': count, 'replay_fps': count / replay_time,
+            'raw_fps': count / raw_time}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=2000,
+                        help="number of exported replay frames")
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=[1, os.cpu_count()])
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--output', help="JSON file (default: stdout)")
+    args = parser.parse_args(args)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'cpus': os.cpu_count(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'rendering': [rendering(block_size, args.repeat)
+                            for block_size in block_sizes],
+              'export': []}
+    for block_size in block_sizes:
+        for processes in sorted(set(args.processes)):
+            directory = tempfile.mkdtemp()
+            try:
+                report['export'].append(export(directory, args.frames,
+                                               processes, block_size))
+            finally:
+                shutil.rmtree(directory)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""Compares saving and loading of games in the binary and in the text format.
+Run from the repository root: python -m benchmarks.save_formats"""
+
+import os
+import tempfile
+import timeit
+
+import engine
+from benchmarks import boards
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    print(f"{'height':>6} {'format':>6} {'size [B]':>9} "
+          f"{'save [us]':>10} {'load [us]':>10}")
+    for height in 0, 5, 10, 15, 19:
+        game = boards.synthetic_engine(height, fragments=height * 5)
+        loaded = engine.Engine()
+        for name, binary in ('binary', True), ('text', False):
+            filename = os.path.join(directory, f'{height}.{name}.tet')
+            save = timeit.Timer(lambda: game.save(filename, binary))
+            number, _ = save.autorange()
+            save_time = min(save.repeat(5, number)) / number
+            load = timeit.Timer(lambda: loaded.load(filename))
+            number, _ = load.autorange()
+            load_time = min(load.repeat(5, number)) / number
+            print(f"{height:>6} {name:>6} {os.path.getsize(filename):>9} "
+                  f"{save_time * 1e6:>10.1f} {load_time * 1e6:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
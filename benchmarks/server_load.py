@@ -0,0 +1,140 @@
+"""Load generator for the headless game server ('server.py').
+Opens many connections, each playing several sessions with random keys and
+state queries, and reports round trip times of requests, lateness of time
+steps and sessions per CPU core as JSON.
+Without --unix or --port a server is started in a subprocess.
+Run from the repository root:
+    python -m benchmarks.server_load [--connections 20] [--sessions 10]
+        [--speed 10] [--duration 10] [--rate 20] [--unix PATH | --port PORT]
+        [--output results.json]"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import instrument
+
+
+keys = ['Left', 'Right', 'Up', 'Down', 'space']
+
+
+async def request(reader, writer, line, latencies):
+    """Sends request [line] and returns the response, round trip time is
+    added to [latencies]."""
+    start = time.perf_counter_ns()
+    writer.write(line.encode() + b'\n')
+    response = (await reader.readline()).decode().strip()
+    latencies.add(time.perf_counter_ns() - start)
+    if not response.startswith('ok'):
+        raise RuntimeError(f"Request '{line}' failed: {response}")
+    return response[3:]
+
+
+async def client(connect, args, seed, latencies):
+    """Plays [args.sessions] sessions over one connection for
+    [args.duration] seconds, [args.rate] requests per second per session."""
+    reader, writer = await connect()
+    generator = random.Random(seed)
+    sessions = []
+    for i in range(args.sessions):
+        id = await request(reader, writer,
+                           f'new {seed * 1000 + i} 20 15 {args.speed}',
+                           latencies)
+        sessions.append(id)
+    end = time.monotonic() + args.duration
+    while time.monotonic() < end:
+        for id in sessions:
+            if generator.random() < 0.2:
+                await request(reader, writer, f'state {id}', latencies)
+            else:
+                await request(reader, writer,
+                              f'key {id} {generator.choice(keys)}', latencies)
+        await asyncio.sleep(1 / args.rate)
+    writer.close()
+
+
+async def run(args, connect):
+    latencies = instrument.Histogram()
+    await asyncio.gather(*[client(connect, args, seed, latencies)
+                           for seed in range(args.connections)])
+    # Sessions of the clients have been closed with their connections
+    reader, writer = await connect()
+    stats = json.loads(await request(reader, writer, 'stats',
+                                     instrument.Histogram()))
+    writer.close()
+    return latencies, stats
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--connections', type=int, default=20)
+    parser.add_argument('--sessions', type=int, default=10,
+                        help="number of sessions per connection")
+    parser.add_argument('--speed', type=float, default=10,
+                        help="how many times faster time steps come")
+    parser.add_argument('--duration', type=float, default=10,
+                        help="length of the load in seconds")
+    parser.add_argument('--rate', type=float, default=20,
+                        help="requests per second per session")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help="port of a running server")
+    parser.add_argument('--unix', metavar='PATH',
+                        help="Unix socket of a running server")
+    parser.add_argument('--output', help="JSON file (default: stdout)")
+    args = parser.parse_args(args)
+
+    process = None
+    if args.port is None and args.unix is None:
+        args.unix = os.path.join(tempfile.mkdtemp(), 'server.sock')
+        process = subprocess.Popen([sys.executable, 'server.py',
+                                    '--unix', args.unix])
+        while not os.path.exists(args.unix):
+            time.sleep(0.05)
+
+    if args.unix is not None:
+        def connect():
+            return asyncio.open_unix_connection(args.unix, limit=1 << 20)
+    else:
+        def connect():
+            return asyncio.open_connection(args.host, args.port,
+                                           limit=1 << 20)
+
+    try:
+        latencies, stats = asyncio.run(run(args, connect))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    # Share of a CPU core used by the server while under the load
+    cpu_load = stats['cpu_time'] / stats['wall_time']
+    sessions = args.connections * args.sessions
+    # A session [speed] times faster than the game counts as [speed] sessions
+    # played in real time
+    realtime_sessions = sessions * args.speed
+    report = {'connections': args.connections,
+              'sessions': sessions,
+              'speed': args.speed,
+              'duration': args.duration,
+              'request_latency': latencies.summary(),
+              'server': stats,
+              'ticks_per_second': stats['ticks'] / stats['wall_time'],
+              'cpu_load': cpu_load,
+              'sessions_per_core': (realtime_sessions / cpu_load
+                                    if cpu_load else None)}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
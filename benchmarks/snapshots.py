@@ -0,0 +1,118 @@
+"""Costs of in-memory snapshots ('snapshot') - time to take one every time
+step, memory kept per snapshot in a full ring and time to restore snapshots
+of synthetic boards, compared to the binary save format. Writes JSON.
+Run from the repository root:
+    python -m benchmarks.snapshots [--ticks 3000] [--output results.json]"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import engine
+import savefile
+import snapshot
+from benchmarks import boards
+
+
+keys = ['Left', 'Right', 'Up', 'Down', 'space']
+
+
+def retained_size(snapshots):
+    """Returns number of bytes of all objects reachable from [snapshots]
+    (tuples, numbers, strings), objects shared by several snapshots are
+    counted once."""
+    seen = set()
+    stack = list(snapshots)
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, tuple):
+            stack.extend(item)
+    return size
+
+
+def ring(ticks, seed=0):
+    """Plays [ticks] time steps with random keys, taking snapshot after each
+    of them into a ring large enough for all of them."""
+    game = engine.Engine(seed=seed)
+    generator = random.Random(seed)
+    snapshots = snapshot.SnapshotRing(ticks)
+    clock = time.perf_counter_ns
+    times = []
+    for _ in range(ticks):
+        if game.is_game_over:
+            game.new_game()
+        for _ in range(generator.randrange(3)):
+            game.press(generator.choice(keys))
+        game.time_step()
+        start = clock()
+        snapshots.take(game)
+        times.append((clock() - start) / 1000)
+    retained = retained_size(snapshots.snapshots)
+    return {'ticks': ticks,
+            'take_us': {'mean': statistics.fmean(times),
+                        'p50': statistics.median(times),
+                        'p99': statistics.quantiles(times, n=100)[98],
+                        'max': max(times)},
+            'retained_bytes': retained,
+            'bytes_per_snapshot': retained / ticks}
+
+
+def restore(height, fragments, number=200):
+    """Returns times of restoring a snapshot of a synthetic board and of
+    loading the same board from the binary format in microseconds."""
+    game = boards.synthetic_engine(height, fragments, active='T')
+    state = game.snapshot()
+    data = savefile.dumps(game)
+    target = engine.Engine()
+
+    def measure(function):
+        times = []
+        for _ in range(number):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return statistics.median(times) * 1e6
+
+    def load():
+        target.is_game_over = False
+        target.clear()
+        savefile.loads(target, data)
+
+    return {'height': height, 'fragments': fragments,
+            'snapshot_bytes': retained_size([state]),
+            'restore_us': measure(lambda: target.restore(state)),
+            'take_us': measure(lambda: game.snapshot()),
+            'savefile_load_us': measure(load)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ticks', type=int, default=3000)
+    parser.add_argument('--output', help="JSON file (default: stdout)")
+    args = parser.parse_args(args)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'ring': ring(args.ticks),
+              'restore': [restore(height, fragments) for height, fragments
+                          in [(0, 0), (5, 10), (10, 20), (19, 38), (19, 133)]]}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Sizes and costs of the spectator stream ('stream') compared to saved games.
+Plays headless games with random keys, encodes every time step and reports
+sizes of frames, time to encode and decode them and time to publish a time
+step to many local subscribers as JSON.
+Run from the repository root:
+    python -m benchmarks.stream_fanout [--ticks 3000]
+        [--subscribers 1 100 500] [--output results.json]"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import engine
+import savefile
+import stream
+
+
+keys = ['Left', 'Right', 'Up', 'Down', 'space']
+
+
+def play(ticks, seed=0):
+    """Yields headless game after each of [ticks] time steps with random keys
+    pressed in between. Games, which are over, start again."""
+    game = engine.Engine(seed=seed)
+    generator = random.Random(seed)
+    for _ in range(ticks):
+        if game.is_game_over:
+            game.new_game()
+        for _ in range(generator.randrange(3)):
+            game.press(generator.choice(keys))
+        game.time_step()
+        yield game
+
+
+def summary(values):
+    return {'mean': statistics.fmean(values),
+            'p50': statistics.median(values),
+            'max': max(values)}
+
+
+def frames(ticks):
+    """Returns results of encoding and decoding of a played game."""
+    encoder = stream.Encoder()
+    decoder = stream.Decoder()
+    clock = time.perf_counter_ns
+    encode_times, keyframe_times, decode_times = [], [], []
+    delta_sizes, keyframe_sizes, binary_sizes, text_sizes = [], [], [], []
+    for game in play(ticks):
+        start = clock()
+        delta = encoder.encode(game)
+        encode_times.append((clock() - start) / 1000)
+        start = clock()
+        keyframe = encoder.keyframe()
+        keyframe_times.append((clock() - start) / 1000)
+        frame = delta if decoder.tick is not None else keyframe
+        start = clock()
+        decoder.apply(frame)
+        decode_times.append((clock() - start) / 1000)
+        delta_sizes.append(len(delta))
+        keyframe_sizes.append(len(keyframe))
+        binary_sizes.append(len(savefile.dumps(game)))
+        text_sizes.append(len(savefile.dumps_text(game)))
+    return {'ticks': ticks,
+            'encode_us': summary(encode_times),
+            'keyframe_us': summary(keyframe_times),
+            'decode_us': summary(decode_times),
+            'delta_bytes': summary(delta_sizes),
+            'keyframe_bytes': summary(keyframe_sizes),
+            'savefile_binary_bytes': summary(binary_sizes),
+            'savefile_text_bytes': summary(text_sizes)}
+
+
+def fanout(ticks, subscribers, keyframe_interval=100):
+    """Returns time to publish a time step to [subscribers] subscribers, which
+    only keep the frames (as a socket would)."""
+    broadcaster = stream.Broadcaster(keyframe_interval)
+    queues = [[] for _ in range(subscribers)]
+    for queue in queues:
+        broadcaster.subscribe(lambda frame, queue=queue: queue.append(frame)
+                              or True)
+    clock = time.perf_counter_ns
+    times = []
+    sent = 0
+    for game in play(ticks):
+        start = clock()
+        broadcaster.publish(game)
+        times.append((clock() - start) / 1000)
+        for queue in queues:
+            sent += sum(map(len, queue))
+            queue.clear()
+    return {'subscribers': subscribers,
+            'publish_us': summary(times),
+            'bytes_per_tick': sent / ticks}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ticks', type=int, default=3000)
+    parser.add_argument('--subscribers', type=int, nargs='+',
+                        default=[1, 100, 500])
+    parser.add_argument('--output', help="JSON file (default: stdout)")
+    args = parser.parse_args(args)
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'frames': frames(args.ticks),
+              'fanout': [fanout(args.ticks, subscribers)
+                         for subscribers in args.subscribers]}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+import array
+import bisect
+
+import square as sq
+
+class BoardSizeError(Exception): pass
+
+
+def _blocks(rows):
+    """Yields (first, last) of every run of adjacent [rows] (sorted)."""
+    first = last = None
+    for row in rows:
+        if last is not None and row != last + 1:
+            yield first, last
+            first = None
+        if first is None:
+            first = row
+        last = row
+    if first is not None:
+        yield first, last
+
+
+class Board:
+    """Occupancy grid of the active area.
+    Squares of shapes, which have landed (locked squares), are not objects.
+    Grid holds only the type code of the shape ('shape.type_codes') for every
+    cell occupied by a locked square (0 for free ones) in one flat bytearray
+    'colors' and the number of the piece, which the square belongs to, in
+    the array 'pieces' (0 for free cells). A piece is a locked shape or its
+    part separated by erasing lines, which falls on its own, see module
+    'gravity'. Cells are stored row-major and also cover two hidden rows with
+    numbers -1 and -2, where shapes spawn. Erasing rows then costs a few
+    slice moves, see 'erase_rows'.
+    Only the falling (active) shape remains a 'Shape' object, see
+    'set_falling'. It is not a part of the grid, but it is taken into account
+    by 'is_free', 'row_masks' and 'cells', until it is locked ('lock').
+    Number of locked squares in every row is counted as well, so that full
+    rows are known without examining them.
+    Size of the board is given per game. Every operation on a shape costs
+    the same regardless of it.
+
+    Highest row occupied by a locked square in every column (skyline) is kept
+    as well, so that the place, where a shape lands, is found without moving
+    it down block by block, see 'drop_distance'."""
+
+    hidden_rows = 2     # Rows above the visible area, where shapes spawn
+    min_columns = 4     # Shapes spawn in a box 2x4 in the middle
+
+    def __init__(self, no_rows, no_columns):
+        if no_rows < 1 or no_columns < Board.min_columns:
+            message = f"Board {no_rows}x{no_columns} is too small, it needs "
+            message += f"at least 1 row and {Board.min_columns} columns."
+            raise BoardSizeError(message)
+        self.no_rows = no_rows
+        self.no_columns = no_columns
+        no_cells = (no_rows + Board.hidden_rows) * no_columns
+        # Both changed only by methods of the board
+        self.colors = bytearray(no_cells)
+        self.pieces = array.array('I', bytes(4 * no_cells))
+        self._last_piece = 0    # Pieces are never numbered the same again
+        self._row_counts = [0] * (no_rows + Board.hidden_rows)
+        self._full_rows = set()
+        # Highest row occupied by a locked square in every column (no_rows if
+        # there is none). Columns in '_stale_tops' have to be found out again,
+        # as their highest square has been removed.
+        self._tops = [no_rows] * no_columns
+        self._stale_tops = set()
+        self._falling = None
+        # Changes whenever locked squares change, see module 'snapshot'
+        self.version = 0
+
+    def _index(self, row, column):
+        return (row + Board.hidden_rows) * self.no_columns + column
+
+    def is_inside(self, row, column):
+        """Returns True/False, whether ([row], [column]) is a valid position."""
+        return (-Board.hidden_rows <= row < self.no_rows
+                and 0 <= column < self.no_columns)
+
+    def test_position(self, row, column):
+        """Raises exception from module 'square' if ([row], [column]) is not
+        a valid position."""
+        sq.Square.test_row_and_column(row, column,
+                                      self.no_rows, self.no_columns)
+
+    def is_free(self, row, column, ignore=None):
+        """Returns True/False, whether position ([row], [column]) is valid and
+        occupied neither by a locked square nor by the falling shape, unless
+        it is [ignore]."""
+        if not self.is_inside(row, column):
+            return False
+        if self.colors[self._index(row, column)]:
+            return False
+        falling = self._falling
+        return (falling is None or falling is ignore
+                or (row, column) not in falling.coords)
+
+    def row_count(self, row):
+        """Returns number of locked squares in the row [row]."""
+        return self._row_counts[row + Board.hidden_rows]
+
+    def full_rows(self):
+        """Returns sorted list of full rows in the visible area."""
+        return sorted(row for row in self._full_rows if row >= 0)
+
+    def code_at(self, row, column):
+        """Returns type code of the locked square at ([row], [column]) or 0."""
+        return self.colors[self._index(row, column)]
+
+    def cells(self):
+        """Returns list of owners of the cells row by row starting by
+        the hidden row -2 - number of the piece for locked squares and None
+        for free cells, the falling shape is not included. Used by module
+        'stream'."""
+        return [piece or None for piece in self.pieces]
+
+    def piece_cells(self):
+        """Returns dictionary of all the pieces and lists of indices (as in
+        'colors') of their cells, in the order of the cells."""
+        result = {}
+        for index, piece in enumerate(self.pieces):
+            if piece:
+                result.setdefault(piece, []).append(index)
+        return result
+
+    def piece_indices(self, piece, row):
+        """Returns sorted list of indices (as in 'colors') of the cells of
+        the [piece], which has a square in the [row]. Only rows of the piece
+        are examined, as they follow one another."""
+        no_columns = self.no_columns
+        pieces = self.pieces
+        start = self._index(row, 0)
+        while start >= no_columns and piece in pieces[start - no_columns:
+                                                      start]:
+            start -= no_columns
+        indices = []
+        for start in range(start, len(pieces), no_columns):
+            end = start + no_columns
+            count = len(indices)
+            index = start
+            while True:
+                try:
+                    index = pieces.index(piece, index, end)
+                except ValueError:
+                    break
+                indices.append(index)
+                index += 1
+            if len(indices) == count:
+                break
+        return indices
+
+    def row_masks(self, ignore=None):
+        """Returns tuple of bitmasks of occupied blocks of all rows (hidden
+        ones included), bit [column] is set if the block is occupied by
+        a locked square or by the falling shape, unless it is [ignore].
+        Used by module 'placements'."""
+        no_columns = self.no_columns
+        colors = self.colors
+        masks = []
+        for index, count in enumerate(self._row_counts):
+            mask = 0
+            if count:
+                start = index * no_columns
+                for column in range(no_columns):
+                    if colors[start + column]:
+                        mask |= 1 << column
+            masks.append(mask)
+        if self._falling is not None and self._falling is not ignore:
+            for row, column in self._falling.coords:
+                masks[row + Board.hidden_rows] |= 1 << column
+        return tuple(masks)
+
+    def set_falling(self, shape):
+        """Sets [shape] (or None) as the falling shape. It is not a part of
+        the grid, so it does not affect the skyline."""
+        self._falling = shape
+
+    def top(self, column):
+        """Returns highest row in [column] occupied by a locked square or
+        number of rows if there is no such."""
+        if column in self._stale_tops:
+            self._stale_tops.discard(column)
+            cells = self.colors[column::self.no_columns]
+            free = len(cells) - len(cells.lstrip(b'\0'))
+            self._tops[column] = free - Board.hidden_rows
+        return self._tops[column]
+
+    def drop_distance(self, shape):
+        """Returns number of blocks, by which the [shape] can fall until it
+        lands. Found by the skyline if the shape is above it, otherwise
+        see 'Shape.drop_distance'."""
+        lowest = {}
+        for row, column in shape.coords:
+            if row > lowest.get(column, row - 1):
+                lowest[column] = row
+        distance = self.no_rows + Board.hidden_rows
+        for column, row in lowest.items():
+            top = self.top(column)
+            if row >= top:
+                # Shape is under an overhang, it has to be checked directly
+                return shape.drop_distance(self)
+            distance = min(distance, top - 1 - row)
+        return distance
+
+    def _change_count(self, index, change):
+        """Changes number of locked squares in the row with index [index]
+        (hidden rows included) by [change]."""
+        self._row_counts[index] += change
+        if self._row_counts[index] == self.no_columns:
+            self._full_rows.add(index - Board.hidden_rows)
+        else:
+            self._full_rows.discard(index - Board.hidden_rows)
+
+    def _put(self, index, code, piece):
+        """Puts locked square of the [piece] with type [code] into the cell
+        [index], or frees the cell if [piece] is 0."""
+        if bool(self.pieces[index]) != bool(piece):
+            self._change_count(index // self.no_columns, 1 if piece else -1)
+        self.colors[index] = code
+        self.pieces[index] = piece
+
+    def new_piece(self):
+        """Returns number of a new piece."""
+        self._last_piece += 1
+        return self._last_piece
+
+    def lock(self, positions, code, piece=None):
+        """Turns [positions] (row, column) into locked squares of type [code]
+        belonging to the [piece] or to a new one, if it is None. Returns
+        the piece's number."""
+        if piece is None:
+            piece = self.new_piece()
+        else:
+            self._last_piece = max(self._last_piece, piece)
+        tops = self._tops
+        for row, column in positions:
+            self._put(self._index(row, column), code, piece)
+            if row < tops[column]:
+                tops[column] = row
+        self.version += 1
+        return piece
+
+    def free(self, positions):
+        """Frees locked squares at [positions] (row, column)."""
+        for row, column in positions:
+            self._put(self._index(row, column), 0, 0)
+            if row == self._tops[column]:
+                self._stale_tops.add(column)
+        self.version += 1
+
+    def move_piece(self, indices, distance):
+        """Moves locked squares in cells [indices] (as in 'colors') [distance]
+        rows down and returns their new indices. Used by 'gravity.settle'."""
+        shift = distance * self.no_columns
+        moved = [(index + shift, self.colors[index], self.pieces[index])
+                 for index in indices]
+        for index in indices:
+            self._put(index, 0, 0)
+        no_columns = self.no_columns
+        for index, code, piece in moved:
+            self._put(index, code, piece)
+            self._stale_tops.add(index % no_columns)
+        self.version += 1
+        return [index for index, code, piece in moved]
+
+    def erase_rows(self, rows):
+        """Removes [rows] from the grid - rows above them move down by
+        the number of removed rows below them and empty rows are added at
+        the top. Both planes are moved by slices. Pieces with squares both
+        above and below removed rows are separated into two pieces first, so
+        that they can fall independently from this moment, see module
+        'gravity'. Only rows of such pieces are examined - pieces are never
+        taller than a shape and their rows follow one another.
+        Returns dictionary of pieces, which might have lost their support -
+        right above removed rows or left from pieces with removed squares -
+        and rows, where they have a square after rows are removed. If
+        the board has been settled, no other piece can fall."""
+        no_columns = self.no_columns
+        pieces = self.pieces
+        rows = sorted(rows)
+        counts = self._row_counts
+
+        def row_pieces(row):
+            start = self._index(row, 0)
+            return set(pieces[start:start + no_columns])
+
+        unsupported = {}    # Piece: row before rows are removed
+        # Blocks of adjacent removed rows from the top
+        for first, last in _blocks(rows):
+            above = set()
+            if first > -Board.hidden_rows:
+                above = row_pieces(first - 1)
+                above.discard(0)
+                unsupported.update(dict.fromkeys(above, first - 1))
+            if last == self.no_rows - 1:
+                continue
+            below = row_pieces(last + 1)
+            below.discard(0)
+            block = set(pieces[self._index(first, 0):
+                               self._index(last + 1, 0)])
+            unsupported.update(dict.fromkeys(block & below, last + 1))
+            # Squares below the block get new pieces
+            crossing = above & below
+            renumbered = {}
+            row = last + 1
+            while crossing and row < self.no_rows:
+                for piece in crossing:
+                    if piece not in renumbered:
+                        renumbered[piece] = self.new_piece()
+                        unsupported[renumbered[piece]] = last + 1
+                start = self._index(row, 0)
+                for index in range(start, start + no_columns):
+                    if pieces[index] in crossing:
+                        pieces[index] = renumbered[pieces[index]]
+                row += 1
+                if row < self.no_rows:
+                    crossing &= row_pieces(row)
+            # Their parts above the block keep the number
+            unsupported.update(dict.fromkeys(renumbered, first - 1))
+
+        # Rows below a removed one stay where they are
+        for row in rows:
+            start = self._index(row, 0)
+            end = start + no_columns
+            del self.colors[start:end]
+            self.colors[0:0] = bytes(no_columns)
+            del pieces[start:end]
+            pieces[0:0] = array.array('I', bytes(4 * no_columns))
+            del counts[start // no_columns]
+            counts.insert(0, 0)
+        self._full_rows = {index - Board.hidden_rows
+                           for index, count in enumerate(counts)
+                           if count == no_columns}
+        self._stale_tops.update(range(no_columns))
+        self.version += 1
+        return {piece: row + len(rows) - bisect.bisect(rows, row)
+                for piece, row in unsupported.items()}
+
+    def set_cells(self, colors, pieces):
+        """Replaces all the locked squares by [colors] and [pieces] (bytes as
+        'colors' and 'pieces'). Used by module 'snapshot'."""
+        self.colors[:] = colors
+        self.pieces = array.array('I')
+        self.pieces.frombytes(pieces)
+        no_columns = self.no_columns
+        self._row_counts = [no_columns - self.colors.count(0, start,
+                                                           start + no_columns)
+                            for start in range(0, len(self.colors),
+                                               no_columns)]
+        self._full_rows = {index - Board.hidden_rows
+                           for index, count in enumerate(self._row_counts)
+                           if count == no_columns}
+        self._last_piece = max(self._last_piece, max(self.pieces))
+        self._stale_tops.update(range(no_columns))
+        self.version += 1
+
+    def copy(self):
+        """Returns board with the same locked squares and without the falling
+        shape, which can be changed independently. Used by module
+        'placements'."""
+        board = Board(self.no_rows, self.no_columns)
+        board.colors[:] = self.colors
+        board.pieces = array.array('I', self.pieces)
+        board._last_piece = self._last_piece
+        board._row_counts = self._row_counts[:]
+        board._full_rows = set(self._full_rows)
+        board._tops = self._tops[:]
+        board._stale_tops = set(self._stale_tops)
+        return board
+
+    def clear(self):
+        """Frees all the cells."""
+        self.colors[:] = bytes(len(self.colors))
+        self.pieces = array.array('I', bytes(4 * len(self.colors)))
+        self._row_counts = [0] * len(self._row_counts)
+        self._full_rows.clear()
+        self._tops = [self.no_rows] * self.no_columns
+        self._stale_tops.clear()
+        self._falling = None
+        self.version += 1
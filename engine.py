@@ -0,0 +1,327 @@
+import random
+
+import shape as shp
+import board as brd
+import gravity
+import placements as plc
+import savefile
+import snapshot as snp
+
+
+class Engine():
+    """Class that controls in-game mechanisms without displaying anything -
+    board, shapes, spawning, gravity, erasing of full lines and scoring.
+    It does not depend on tkinter, so it can run without a display and as fast
+    as possible. Class 'Game' in module 'game' is a renderer built on top of it.
+    Only the active shape is a 'Shape' object, shapes are turned into locked
+    squares of the board, as soon as they land, see 'lock'.
+    After full lines are erased, locked squares fall according to
+    [gravity_mode] (one of 'gravity.modes').
+
+    Methods 'choose_next_shape', 'add_points', 'reset_points' and 'game_over'
+    are meant to be extended by subclasses, which need to react to them."""
+
+    shape_types = ['I', 'J', 'L', 'S', 'Z', 'O', 'T']
+
+    def __init__(self, no_rows=20, no_columns=15, renderer=None, seed=None,
+                 gravity_mode='fragments'):
+        self.no_rows = no_rows
+        self.no_columns = no_columns
+        # Left column of the box 2x4, where shapes spawn, in the middle of
+        # the board, the box has to fit into the narrowest boards as well
+        self.spawn_column = min(no_columns // 2 - 1, no_columns - 4)
+        # Renderer drawing shapes, see 'render.Renderer'. None means nothing
+        # is drawn.
+        self.renderer = renderer
+        # Shape types are chosen by own random generator, so that the game can
+        # be reproduced from its seed, see module 'replay'
+        self.random = random.Random()
+        self.reseed(seed)
+        if gravity_mode not in gravity.modes:
+            message = f"Unknown gravity mode '{gravity_mode}'."
+            raise gravity.UnknownGravityModeError(message)
+        self.gravity_mode = gravity_mode
+
+        self.delay = 500     # delay between two subsequent movements down [ms]
+        self.is_game_over = False
+
+        self.deleted_lines = 0  # Raises level
+        # Increased by points, affects delay and number of new points
+        self.level = 1
+        self.points = 0
+
+        # Locked squares and occupancy grid answering whether a block is free,
+        # see 'board.Board'
+        self.board = brd.Board(self.no_rows, self.no_columns)
+        if self.renderer is not None:
+            self.renderer.board = self.board
+        self._active_shape = None
+        self.next_shape_type = None
+        self.start()
+
+    @property
+    def active_shape(self):
+        """Shape controlled by the player, None if it has landed."""
+        return self._active_shape
+
+    @active_shape.setter
+    def active_shape(self, shape):
+        # Board takes the falling shape into account in collision checks
+        self._active_shape = shape
+        self.board.set_falling(shape)
+
+    def new_shape(self, type, **kwargs):
+        """Creates a shape of the type 'type' drawn by the engine's renderer.
+        Keyword arguments are passed to 'Shape' constructor."""
+        return shp.Shape(type, renderer=self.renderer, **kwargs)
+
+    def lock(self, shape):
+        """Turns squares of the [shape] into locked squares of the board,
+        which form a new piece, and deletes the shape. Returns number of
+        the piece."""
+        piece = self.board.lock(shape.coords, shp.type_codes[shape.type])
+        shape.delete()
+        return piece
+
+    def lock_active(self):
+        """Locks the active shape, as it has landed."""
+        shape = self.active_shape
+        self.active_shape = None
+        self.lock(shape)
+
+    def reseed(self, seed=None):
+        """Seeds random generator choosing shape types by [seed] or by a new
+        random one, if it is None."""
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.seed = seed
+        self.random.seed(seed)
+        # Number of shape types chosen since seeding, see module 'snapshot'
+        self.shapes_chosen = 0
+
+    def choose_next_shape(self):
+        """Chooses type of the next shape in the queue."""
+        self.next_shape_type = self.random.choice(self.shape_types)
+        self.shapes_chosen += 1
+
+    def start(self):
+        """Spawns the first active shape and chooses the next one."""
+        type = self.random.choice(self.shape_types)
+        self.shapes_chosen += 1
+        self.active_shape = self.new_shape(type, j0=self.spawn_column)
+        self.choose_next_shape()
+
+    def spawn_shape(self):
+        """Spawns new active shape of the next type in the queue and chooses
+        the type of the next one."""
+        self.active_shape = self.new_shape(self.next_shape_type,
+                                           j0=self.spawn_column)
+        self.choose_next_shape()
+
+    def clear(self):
+        """Deletes the active shape and all locked squares."""
+        self.board.clear()
+        if self.active_shape is not None:
+            self.active_shape.delete()
+        self.active_shape = None
+
+    def new_game(self, seed=None):
+        """Resets the game. Random generator is seeded by [seed], see 'reseed'
+        method."""
+        self.is_game_over = False
+        self.reseed(seed)
+        self.clear()
+        self.start()
+        self.reset_points()
+
+    def game_over(self):
+        self.is_game_over = True
+
+    def time_step(self):
+        """Performs a time step.
+        Treats all cases, which can occur."""
+
+        if self.active_shape is None:
+            # erase_full_lines is called until it returns zero since due to
+            # falling of shapes lines can fill again
+            while self.erase_full_lines():
+                pass
+            # Spawing new active shape and choosing the next one
+            self.spawn_shape()
+            # New active shape starts to fall
+            if not self.active_shape.can_move('<down>', self.board):
+                self.game_over()
+            else:
+                self.active_shape.move('<down>')
+            return
+
+        if self.active_shape.can_move('<down>', self.board):
+            self.active_shape.move('<down>')
+        else:
+            self.lock_active()
+
+    def move_active(self, where):
+        """Moves active shape one block in a direction [where] if possible.
+        Returns True/False whether the move was successful."""
+        if self.active_shape is None:
+            return False
+        return self.active_shape.test_and_move(where, self.board)
+
+    def rotate_active(self):
+        """Rotates active shape if possible.
+        Returns True/False whether the rotation was successful."""
+        if self.active_shape is None:
+            return False
+        return self.active_shape.test_and_rotate(self.board)
+
+    def shift_active(self, columns):
+        """Moves active shape by [columns] blocks to the right (to the left if
+        negative) as far as possible, with the same result as moving it block
+        by block, but the shape moves only once.
+        Returns number of blocks it has moved by."""
+        shape = self.active_shape
+        if shape is None or not columns:
+            return 0
+        step = 1 if columns > 0 else -1
+        coords = shape.coords
+        moved = 0
+        while moved != columns and shape.can_move_to(
+                shp.Shape.shift_positions(coords, 0, moved + step), self.board):
+            moved += step
+        if moved:
+            shape.shift(0, moved)
+        return moved
+
+    def fall_active(self, rows):
+        """Moves active shape [rows] blocks down or until it lands.
+        Returns number of blocks it has fallen by."""
+        if self.active_shape is None:
+            return 0
+        distance = min(rows, self.board.drop_distance(self.active_shape))
+        if distance:
+            self.active_shape.shift(distance, 0)
+        return distance
+
+    def press(self, key, count=1):
+        """Performs action of the key [key] pressed [count] times on the active
+        shape. Returns False for keys, which do not control the game."""
+        if key == 'Left':
+            self.shift_active(-count)
+        elif key == 'Right':
+            self.shift_active(count)
+        elif key == 'Up':
+            # Rotates a shape
+            for _ in range(count):
+                self.rotate_active()
+        elif key == 'Down':
+            # Forces a shape to fall one block immediately
+            self.fall_active(count)
+        elif key == 'space':
+            # Forces shape to immediately land
+            self.hard_drop()
+        else:
+            return False
+        return True
+
+    def placements(self):
+        """Returns all placements of the active shape, which it can reach from
+        its current position, see 'placements.placements'. Their resulting
+        boards follow the gravity mode of the game ('placements.settle')."""
+        shape = self.active_shape
+        if shape is None or shape.orientation is None:
+            return ()
+        row, column = shape.rotation_center
+        result = plc.placements(self.board.row_masks(ignore=shape),
+                                self.no_columns, shape.type,
+                                (shape.orientation, row, column))
+        if self.gravity_mode == 'naive':
+            return result
+        return tuple(plc.settle(self.board, placement, shape.type,
+                                self.gravity_mode)
+                     for placement in result)
+
+    def landing_coords(self):
+        """Returns positions of squares of the active shape after it lands
+        (empty list if there is none), shown as a ghost shape."""
+        if self.active_shape is None:
+            return []
+        distance = self.board.drop_distance(self.active_shape)
+        return shp.Shape.shift_positions(self.active_shape.coords, distance, 0)
+
+    def hard_drop(self):
+        """Forces active shape to immediately land and locks it. Full lines
+        are erased during the next time step.
+        The shape moves at once to the place, where it lands, which is found
+        by the skyline of the board, see 'Board.drop_distance'."""
+        if self.active_shape is None:
+            return
+        distance = self.board.drop_distance(self.active_shape)
+        if distance:
+            self.active_shape.shift(distance, 0)
+        self.lock_active()
+
+    def erase_full_lines(self):
+        """Manages everything what needs to be done after a shape locks -
+        mainly erasing of full lines.
+        Returns number of deleted lines."""
+
+        # Full lines are counted by the board, nothing has to be examined
+        full_rows = self.board.full_rows()
+        no_deleted_lines = len(full_rows)
+        # Continues only if some lines have been deleted
+        if not no_deleted_lines:
+            return 0
+
+        # Add deleted lines, points, update level, etc.
+        self.add_points(no_deleted_lines)
+
+        # Rows are erased by slices of the board, then locked squares fall
+        # according to the gravity mode, see 'gravity.erase'
+        gravity.erase(self.board, full_rows, self.gravity_mode)
+        return no_deleted_lines
+
+    def add_points(self, no_deleted_lines):
+        """Updates number of deleted lines, points, level and increases game
+        speed if needed."""
+
+        self.deleted_lines += no_deleted_lines
+
+        # Falling parts of shapes can fill more than 4 lines at once, they
+        # score as 4 lines
+        factor = {1:40, 2:100, 3:300, 4:1200}
+        self.points += factor[min(no_deleted_lines, 4)] * self.level
+
+        if self.deleted_lines % 10 == 0:
+            self.level += 1
+            self.delay = round(self.delay * 0.8)
+
+    def reset_points(self):
+        """Resets points, number of deleted lines, level and game speed.
+        Used when game is reset."""
+
+        self.deleted_lines = 0
+        self.points = 0
+        self.level = 1
+        self.delay = 500
+
+    def snapshot(self, previous=None):
+        """Returns in-memory snapshot of the game sharing unchanged parts with
+        the snapshot [previous]. See module 'snapshot'."""
+        return snp.take(self, previous)
+
+    def restore(self, snapshot):
+        """Sets the game to the state of the [snapshot]."""
+        snp.restore(self, snapshot)
+
+    def save(self, filename, binary=True):
+        """Saves the game into file [filename] in the binary format or in
+        the text one, if [binary] is False. See module 'savefile'."""
+        savefile.save(self, filename, binary)
+
+    def load(self, filename):
+        """Loads the game from file [filename] in any format. The game is
+        changed only after the whole file has been read and validated."""
+        saved = savefile.read(self, filename)
+        self.is_game_over = False
+        self.clear()
+        savefile.apply(self, saved)
@@ -1,55 +1,132 @@
+import collections
 import tkinter
-import random
 import time
 
 import square as sq
 import shape as shp
-
-
-class Game():
-    """Class that controls most of in-game mechanisms."""
-
-    def __init__(self, program, window, next_shape_canvas):
-        # Do not change these constants. Their changing is not possible without
-        # a manual change of other parameters - mainly shapes' spawnig position.
+import assets
+import engine
+import render
+import replay
+import scheduler
+import snapshot
+
+
+class Game(engine.Engine):
+    """Class that displays the game in tkinter and controls it by keys.
+    In-game mechanisms themselves are handled by 'engine.Engine'."""
+
+    # Largest part of the screen's height taken by the main canvas
+    max_screen_part = 0.8
+    # Pool of canvas items created in advance does not grow over this size.
+    # Renderer creates more items when needed on larger boards.
+    max_pool_size = 5000
+    logic_step = 10         # Length of a logical step of the game [ms]
+    frame_interval = 16     # Delay between two frames [ms]
+    game_keys = ['Left', 'Right', 'Up', 'Down', 'space', 'BackSpace']
+    # Repeat while held
+    repeated_keys = ['Left', 'Right', 'Down', 'BackSpace']
+    rewind_key = 'BackSpace'    # Returns the game one time step back
+    snapshot_capacity = 1000    # Number of time steps, which can be rewound
+    # Sprite sheet with game over animation, see module 'assets'
+    game_over_sheet = 'game_over_images/game_over_sheet.png'
+
+    def __init__(self, program, window, next_shape_canvas,
+                 no_rows=20, no_columns=15, block_size=None, das=170, arr=50,
+                 gravity_mode='fragments'):
+        """Size of the board is [no_rows]x[no_columns]. Squares are drawn
+        [block_size] pixels large, if it is None, they are as large as
+        'Square.a' or smaller, so that the board fits the screen.
+        Held keys start repeating after [das] milliseconds and then repeat
+        every [arr] milliseconds. See 'engine.Engine' for [gravity_mode]."""
         self.program = program  # Which uses an instance of this class
-        self.block_size  = sq.Square.a = 30
-        self.no_rows     = sq.Square.num_rows = 20
-        self.no_columns  = sq.Square.num_columns = 15
+        if block_size is None:
+            max_height = window.winfo_screenheight() * Game.max_screen_part
+            block_size = max(1, min(sq.Square.a, int(max_height // no_rows)))
+        self.block_size = block_size
 
-        self.delay = 500     # delay between two subsequent movements down [ms]
         self.paused = False
-        self.is_game_over = False
-
-        self.deleted_lines = 0                   # Raises level
         self.lines_text = tkinter.StringVar()    # Displayed in lines label
-        self.lines_text.set("Deleted lines: 0")
-        # Increased by points, affects delay and number of new points
-        self.level = 1
-        self.points = 0
         self.points_text = tkinter.StringVar()   # Displayed in points label
-        self.points_text.set("Points: 0")
 
         # Canvas, Where next shape to spawn is shown, should be set before run
         self.next_shape_canvas = next_shape_canvas
         # Main canvas
-        self.canvas_height = self.no_rows*self.block_size
-        self.canvas_width = self.no_columns*self.block_size
+        self.canvas_height = no_rows*self.block_size
+        self.canvas_width = no_columns*self.block_size
         self.canvas = tkinter.Canvas(window,
                                      height=self.canvas_height,
                                      width=self.canvas_width,
                                      bg='black')
         self.canvas.grid(row=0, column=0)
-        shp.Shape.primary_canvas = self.canvas
+        # Outline of the place, where the active shape lands. Its items are
+        # created first, so that squares are drawn over them.
+        self.ghost = [self.canvas.create_rectangle(0, 0, 0, 0, fill='',
+                                                   state='hidden')
+                      for _ in range(4)]
+        self.ghost_of = None    # (active shape, its coords) shown by ghost
+        # Changes of squares are drawn once per time step or pressed key by
+        # renderers with canvas items for every block and for one shape
+        pool_size = min((no_rows + 2) * no_columns, Game.max_pool_size)
+        renderer = render.Renderer(self.canvas, pool_size=pool_size,
+                                   block_size=self.block_size)
+        self.next_shape_renderer = render.Renderer(self.next_shape_canvas,
+                                                   pool_size=4)
+        self.next_shape = None
+        # States after the last time steps, see 'rewind'
+        self.snapshots = snapshot.SnapshotRing(Game.snapshot_capacity)
+
+        super().__init__(no_rows, no_columns, renderer,
+                         gravity_mode=gravity_mode)
+        self.renderer.flush()
+        self.update_ghost()
+        self.update_labels()
+
+        # Game advances in fixed logical steps of a monotonic clock, frames
+        # scheduled in tkinter only catch up with it, see module 'scheduler'
+        self.scheduler = scheduler.Scheduler(step=Game.logic_step)
+        self.key_repeat = scheduler.KeyRepeat(das, arr)
+        self.released = {}      # Keys released since the last frame: time
+        self.key_queue = collections.deque()    # Keys waiting to be performed
+        self.gravity_time = 0   # Time since the last time step [ms]
+        self.frame_cycle = None
+        self.bind_keys()
+        # Records events of the game if set, see 'replay.Recorder'
+        self.recorder = None
 
-        self.shape_types = ['I', 'J', 'L', 'S', 'Z', 'O', 'T']
-        self.active_shape = shp.Shape(random.choice(self.shape_types))
-        self.next_shape_type = random.choice(self.shape_types)
-        self.display_next_shape(self.next_shape_type)
-        self.shapes_in_canvas = {self.active_shape}
+    def start_recording(self, filename):
+        """Starts appending events of the game to the log [filename], so that
+        it can be replayed by 'replay.Player'."""
+        self.recorder = replay.Recorder(filename)
+        self.recorder.start(self)
 
-        self.time_step_cycle = None
-        self.bind_keys()
+    def update_labels(self):
+        """Updates texts displayed in points and lines labels."""
+        self.lines_text.set(f"Deleted lines: {self.deleted_lines}")
+        self.points_text.set(f"Points: {self.points}")
+
+    def update_ghost(self):
+        """Moves ghost outline under the active shape. Landing position is
+        recomputed only if the shape has moved or rotated since then."""
+        shape = self.active_shape
+        state = None if shape is None else (shape, tuple(shape.coords))
+        if state == self.ghost_of:
+            return
+        self.ghost_of = state
+        if shape is None:
+            for tag in self.ghost:
+                self.canvas.itemconfig(tag, state='hidden')
+            return
+        a = self.block_size
+        for tag, (row, column) in zip(self.ghost, self.landing_coords()):
+            x0 = sq.Square.x + column * a
+            y0 = sq.Square.y + row * a
+            self.canvas.coords(tag, x0, y0, x0 + a, y0 + a)
+            self.canvas.itemconfig(tag, state='normal', outline=shape.color)
+
+    def choose_next_shape(self):
+        super().choose_next_shape()
+        self.display_next_shape(self.next_shape_type)
 
     def display_next_shape(self, type):
         """Shows next shape in the queue of the type 'type' in the
@@ -64,38 +141,41 @@ class Game():
         elif type == 'O':
             i0 += 0
             j0 += -0.5
-        self.next_shape_canvas.delete('all')
+        if self.next_shape is not None:
+            self.next_shape.delete()
         self.next_shape = shp.Shape(type, i0=i0, j0=j0,
-                                    canvas=self.next_shape_canvas)
+                                    renderer=self.next_shape_renderer)
+        self.next_shape_renderer.flush()
 
     def run(self):
         """Starts the game for the first time or after it has been paused."""
         self.paused = False
+        self.scheduler.reset()
+        self.gravity_time = 0
         self.time_step()
+        self.schedule_frame()
 
     def pause(self):
         self.paused = True
-        self.canvas.after_cancel(self.time_step_cycle)
-
-    def new_game(self):
+        if self.frame_cycle is not None:
+            self.canvas.after_cancel(self.frame_cycle)
+            self.frame_cycle = None
+        self.key_repeat.clear()
+        self.released.clear()
+        self.key_queue.clear()
+
+    def new_game(self, seed=None):
         """Resets the game."""
 
-        self.is_game_over = False
         self.unbind_keys()
         self.pause()
-
-        for shape in self.shapes_in_canvas:
-            shape.delete()
-        self.shapes_in_canvas.clear()
-
-        self.active_shape = shp.Shape(random.choice(self.shape_types))
-        self.shapes_in_canvas = {self.active_shape}
-        self.next_shape_type = random.choice(self.shape_types)
-        self.display_next_shape(self.next_shape_type)
+        super().new_game(seed)
+        self.snapshots.clear()
+        if self.recorder is not None:
+            self.recorder.record('new', self.seed)
+        self.renderer.flush()
+        self.update_ghost()
         self.canvas.update()
-
-        self.reset_points()
-        self.time_step_cycle = None
         time.sleep(0.6)
 
         # In case game was previously over
@@ -104,16 +184,15 @@ class Game():
         self.run()
 
     def game_over(self):
+        super().game_over()
+        self.renderer.flush()
+        self.update_ghost()
         self.pause()
         self.unbind_keys()
         self.program.pause_button.config(state='disabled')
-        self.is_game_over = True
 
-        # Loading individual phases of game over animation
-        self.game_over_phases = []
-        for i in range(8):
-            filename = 'game_over_images/game_over_' + str(i) +'.png'
-            self.game_over_phases.append(tkinter.PhotoImage(file=filename))
+        # Individual phases of game over animation, decoded only once
+        self.game_over_phases = assets.cache.frames(Game.game_over_sheet)
         x = self.canvas_width // 2
         y = self.canvas_height // 2
         self.game_over_image = self.canvas.create_image(x, y,
@@ -126,7 +205,8 @@ class Game():
         Lasts until self.is_game_over turns False"""
         if self.is_game_over:
             self.canvas.itemconfig(self.game_over_image,
-                                   image=self.game_over_phases[i % 8])
+                                   image=self.game_over_phases[
+                                       i % len(self.game_over_phases)])
             self.canvas.after(100, lambda: self.game_over_set_phase(i+1))
             self.canvas.update()
         else:
@@ -134,282 +214,152 @@ class Game():
 
     def bind_keys(self):
         """Binds all keys, by which the game is controlled."""
-        for key in '<Left>', '<Right>', '<Up>', '<Down>', '<space>':
-            self.canvas.bind_all(key, self.key_pressed)
+        for key in Game.game_keys:
+            self.canvas.bind_all(f'<KeyPress-{key}>', self.key_pressed)
+            self.canvas.bind_all(f'<KeyRelease-{key}>', self.key_released)
 
     def unbind_keys(self):
         """Unbinds all keys, by which the game is controlled."""
-        for key in '<Left>', '<Right>', '<Up>', '<Down>', '<space>':
-            self.canvas.unbind_all(key)
+        for key in Game.game_keys:
+            self.canvas.unbind_all(f'<KeyPress-{key}>')
+            self.canvas.unbind_all(f'<KeyRelease-{key}>')
 
     def time_step(self):
-        """Performs a time step.
-        Treats all cases, which can occur."""
-
-        if self.active_shape == None:
-            # Erasing full lines. Keys are unbinded as it seems that pressing
-            # a key while erasing lines can cause problems.
-            # erase_full_lines is called until it returns zero since due to
-            # falling of shapes lines can fill again
-            self.unbind_keys()
-            while self.erase_full_lines():
-                pass
-            self.bind_keys()
-            # Spawing new active shape
-            self.active_shape = shp.Shape(self.next_shape_type)
-            self.shapes_in_canvas.add(self.active_shape)
-            # Choosing and displaying the next shape in the queue
-            self.next_shape_type = random.choice(self.shape_types)
-            self.display_next_shape(self.next_shape_type)
-            # New active shape starts to fall
-            if not self.active_shape.can_move('<down>', self.shapes_in_canvas):
-                self.game_over()
-            else:
-                self.active_shape.move('<down>')
-                self.call_next_time_step()
-            return
+        """Performs a time step - active shape falls or locks."""
 
-        if self.active_shape.can_move('<down>', self.shapes_in_canvas):
-            self.active_shape.move('<down>')
-        else:
-            self.active_shape = None
-        self.call_next_time_step()
+        if self.recorder is not None:
+            self.recorder.record('tick')
+        # Keys pressed meanwhile wait in the queue, see 'key_pressed'
+        super().time_step()
+        if self.is_game_over:
+            return
+        self.snapshots.take(self)
+        self.renderer.flush()
+        self.update_ghost()
 
-    def call_next_time_step(self):
+    def schedule_frame(self):
         """Private method.
-        Safely calles next time step, i.e. deletes another call if there is such
-        present, in order to prevent double canvas.after cycle, which would
-        increase the game speed."""
-
-        if self.time_step_cycle is not None:
-            self.canvas.after_cancel(self.time_step_cycle)
-        self.time_step_cycle = self.canvas.after(self.delay, self.time_step)
+        Schedules the next frame. Frames are only chances to catch up with
+        the clock, so their delays do not change speed of the game."""
+        self.frame_cycle = self.canvas.after(Game.frame_interval, self.frame)
+
+    def frame(self):
+        """Performs all logical steps, which have passed since the last frame
+        - queued and repeated keys and time steps every 'delay' milliseconds -
+        draws their result and schedules the next frame."""
+
+        self.frame_cycle = None
+        for key in self.released:
+            self.key_repeat.release(key)
+        self.released.clear()
+
+        step = self.scheduler.step
+        for _ in range(self.scheduler.advance()):
+            repeats = self.key_repeat.advance(step)
+            if self.active_shape is not None:
+                # Held keys do not pile up, while there is no shape to move
+                self.key_queue.extend(repeats)
+            self.perform_keys()
+            self.gravity_time += step
+            if self.gravity_time >= self.delay:
+                self.gravity_time -= self.delay
+                self.time_step()
+            if self.paused:
+                # Game is over
+                return
+        self.renderer.flush()
+        self.update_ghost()
+        self.schedule_frame()
 
     def key_pressed(self, event):
-        """Reacts to pressed key of any relevant kind."""
+        """Queues pressed key of any relevant kind. Keys are performed by
+        'frame', as well as repeats of keys held down."""
         key = event.keysym
-        if self.active_shape == None:
+        if key in self.released:
+            # Repeating keys, the system sends release and press at once
+            if self.released.pop(key) == event.time:
+                return
+            self.key_repeat.release(key)
+        if self.key_repeat.press(key, repeat=key in Game.repeated_keys):
+            self.key_queue.append(key)
+
+    def key_released(self, event):
+        """Remembers released key. It stops being held at the next frame
+        unless it is pressed again at the same moment."""
+        self.released[event.keysym] = event.time
+
+    def perform_keys(self):
+        """Performs actions of all queued keys. Subsequent presses of the same
+        key are merged into one action, e.g. several 'Left' keys move
+        the shape by several blocks at once. While there is no active shape
+        (lines are being erased), keys wait in the queue until the next shape
+        appears, they are discarded only by pausing and game over."""
+        queue = self.key_queue
+        while queue:
+            if self.active_shape is None and queue[0] != Game.rewind_key:
+                break
+            key = queue.popleft()
+            count = 1
+            while queue and queue[0] == key:
+                queue.popleft()
+                count += 1
+            self.perform(key, count)
+
+    def perform(self, key, count=1):
+        """Performs action of the [key] pressed [count] times."""
+        if self.recorder is not None:
+            for _ in range(count):
+                self.recorder.record('key', key)
+        if key == Game.rewind_key:
+            self.rewind(count)
+        elif self.active_shape == None:
             pass
-        elif key == 'Left':
-            self.active_shape.test_and_move('<left>', self.shapes_in_canvas)
-        elif key == 'Right':
-            self.active_shape.test_and_move('<right>', self.shapes_in_canvas)
-        elif key == 'Up':
-            # Rotates a shape
-            self.active_shape.test_and_rotate(self.shapes_in_canvas)
-        elif key == 'Down':
-            # Forces a shape to fall one block immediately
-            # self.time_step timer is cancelled, so that shape does not fall
-            # both due to time flow and pressing '<Down>' key.
-            # After falling one block the timer restarts.
-            self.canvas.after_cancel(self.time_step_cycle)
-            self.active_shape.test_and_move('<down>', self.shapes_in_canvas)
-            self.call_next_time_step()
-        elif key == 'space':
-            # Forces shape to immediately land
-            self.canvas.after_cancel(self.time_step_cycle)
-            while self.active_shape.can_move('<down>', self.shapes_in_canvas):
-                self.active_shape.move('<down>')
-            self.active_shape = None
-            self.call_next_time_step()
-        else:
+        elif key in ('Down', 'space'):
+            # Shape falls or lands immediately.
+            # Time of the next time step is reset, so that shape does not
+            # fall both due to time flow and pressing the key.
+            self.press(key, count)
+            self.gravity_time = 0
+        elif not self.press(key, count):
             print(key)
 
-    def erase_full_lines(self):
-        """Manages everything what needs to be done after a shape locks -
-        mainly erasing of full lines.
-        Returns number of deleted lines."""
-
-        no_rows = self.no_rows
-        no_columns = self.no_columns
-
-        # Detecting full lines
-        no_deleted_lines = 0
-        for row in range(0, no_rows):
-            row_full = True
-            shapes_in_row = set()
-            for column in range(0, no_columns):
-                # Detecting, whether block at (row, column) is occupied
-                block_occupied = False
-                for shape in self.shapes_in_canvas:
-                    if shape.is_at(row, column):
-                        block_occupied = True
-                        shapes_in_row.add(shape)
-                        break
-                if not block_occupied:
-                    row_full = False
-                    break
-
-            # If this row is full two processes occur:
-            # 1.) All squares in the line are deleted
-            # 2.) Shapes with squares both above and below the deleted line are
-            #     separated into two parts, so that they can fall independently
-            #     from this moment
-            if row_full:
-                no_deleted_lines += 1
-                # Deleting squares in line
-                for column in range(0, no_columns):
-                    for shape in shapes_in_row:
-                        if shape.is_at(row, column):
-                            shape.delete_square_at(row, column)
-                # Dividing shapes_in_row into two parts
-                for shape in shapes_in_row:
-                    part_above = shp.Shape(shape.type, empty=True)
-                    self.shapes_in_canvas.add(part_above)
-                    for square in list(shape.squares):
-                        if square.row > row:
-                            shape.remove_square(square)
-                            part_above.add_square(square)
-
-        # Continues only if some lines have been deleted
-        if not no_deleted_lines:
-            return 0
-
-        # Deleting all shapes containing no squares
-        for shape in list(self.shapes_in_canvas):
-            if len(shape.coords) == 0:
-                self.shapes_in_canvas.discard(shape)
-
-        # Add deleted lines, points, update level, etc.
-        self.add_points(no_deleted_lines)
-
-        # Falling of blocks
-        # All shapes try to move down one after another until the situation
-        # is not changed by two consecutive iterations
-        times_unchanged = 0
-        while times_unchanged < 2:
-            has_changed = False
-            for shape in self.shapes_in_canvas:
-                if shape.test_and_move('<down>', self.shapes_in_canvas):
-                    has_changed = True
-            if not has_changed:
-                times_unchanged += 1
-            else:
-                times_unchanged = 0
-        return no_deleted_lines
+    def rewind(self, steps=1):
+        """Returns the game [steps] time steps back, as far as snapshots
+        taken after time steps reach."""
+        snapshot = self.snapshots.rewind(steps)
+        if snapshot is not None:
+            self.restore(snapshot)
+            self.gravity_time = 0
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        if self.recorder is not None:
+            # Log does not contain state of the random generator, so it is
+            # reseeded, see 'replay.Recorder.start'
+            self.recorder.start(self)
+        self.update_labels()
+        self.display_next_shape(self.next_shape_type)
+        self.renderer.flush()
+        self.update_ghost()
 
     def add_points(self, no_deleted_lines):
-        """Updates number of deleted lines, points, level and increases game
-        speed if needed."""
-
-        self.deleted_lines += no_deleted_lines
-        self.lines_text.set(f"Deleted lines: {self.deleted_lines}")
-
-        factor = {1:40, 2:100, 3:300, 4:1200}
-        self.points += factor[no_deleted_lines] * self.level
-        self.points_text.set(f"Points: {self.points}")
-
-        if self.deleted_lines % 10 == 0:
-            self.level += 1
-            self.delay = round(self.delay * 0.8)
+        super().add_points(no_deleted_lines)
+        self.update_labels()
 
     def reset_points(self):
-        """Resets points, number of deleted lines, level and game speed.
-        Used when game is reset."""
-
-        self.deleted_lines = 0
-        self.lines_text.set(f"Deleted lines: {self.deleted_lines}")
-
-        self.points = 0
-        self.points_text.set(f"Points: {self.points}")
-
-        self.level = 1
-        self.delay = 500
-
-    def save(self, filename):
-        with open(filename, 'w') as file:
-            # Writing game stats
-            file.write(str(self.points) + '\n')
-            file.write(str(self.deleted_lines) + '\n')
-            file.write(str(self.level) + '\n')
-            file.write(str(self.delay) + '\n\n')
-
-            # Writing next shape type
-            file.write(self.next_shape_type + '\n\n')
-
-            # Writing active shape info
-            if self.active_shape is not None:
-                file.write(self.active_shape.type + '\n')
-                row, column = self.active_shape.rotation_center
-                file.write(str(row) + ' ' + str(column) + '\n')
-                for square in self.active_shape.squares:
-                    file.write(str(square.row) + ' ' + str(square.column) +'\n')
-            else:
-                file.write("None" + '\n')
-            file.write('\n\n')
-
-            # Writing other shapes info
-            for shape in self.shapes_in_canvas - {self.active_shape}:
-                file.write(shape.type + '\n')
-                for square in shape.squares:
-                    file.write(str(square.row) + ' ' + str(square.column) +'\n')
-                file.write('\n')
+        super().reset_points()
+        self.update_labels()
 
     def load(self, filename):
         # Game paused and keys unbinded by program object
-        self.is_game_over = False
-
-        for shape in self.shapes_in_canvas:
-            shape.delete()
-        self.shapes_in_canvas.clear()
-
-        with open(filename) as file:
-            # Loading game stats
-            self.points = int(file.readline())
-            self.points_text.set(f"Points: {self.points}")
-
-            self.deleted_lines = int(file.readline())
-            self.lines_text.set(f"Deleted lines: {self.deleted_lines}")
-
-            self.level = int(file.readline())
-            self.delay = int(file.readline())
-
-            # Loading next shape type
-            file.readline()
-            self.next_shape_type = file.readline().strip()
-            self.display_next_shape(self.next_shape_type)
-            file.readline()
-
-            # Loading active shape
-            type = file.readline().strip()
-            self.active_shape = shp.Shape(type, empty=True)
-            color = self.active_shape.color
-
-            row, column = file.readline().split()
-            row = int(row)
-            column = int(column)
-            self.active_shape.rotation_center = [row, column]
-
-            line = file.readline().strip()
-            while line:
-                row, column = line.split()
-                row = int(row)
-                column = int(column)
-                self.active_shape.add_square(sq.Square(self.canvas,
-                                                       row, column,
-                                                       color))
-                line = file.readline().strip()
-            self.shapes_in_canvas = {self.active_shape}
-            file.readline()
-
-            # Loading other shapes
-            while True:
-                type = file.readline().strip()
-                if not type:    # End of .tet file
-                    break
-                shape = shp.Shape(type, empty=True)
-                color = shape.color
-                self.shapes_in_canvas.add(shape)
-                line = file.readline().strip()
-                while line:
-                    row, column = line.split()
-                    row = int(row)
-                    column = int(column)
-                    shape.add_square(sq.Square(self.canvas,
-                                               row, column,
-                                               color))
-                    line = file.readline().strip()
+        super().load(filename)
+        self.snapshots.clear()
+        if self.recorder is not None:
+            self.recorder.record_state(self)
+        self.update_labels()
+        self.display_next_shape(self.next_shape_type)
 
+        self.renderer.flush()
+        self.update_ghost()
         self.canvas.update()
-        self.time_step_cycle = None
         time.sleep(0.6)
@@ -0,0 +1,87 @@
+import heapq
+
+
+class UnknownGravityModeError(Exception): pass
+
+
+# How locked squares fall after full lines are erased. Rows above erased ones
+# move down by the number of erased rows below them in both modes, then
+# - 'fragments' - every piece (a shape or its part separated by erasing
+#                 lines) falls on its own until it lands, see 'settle',
+# - 'naive'     - nothing else falls, as in classic games.
+modes = ('fragments', 'naive')
+
+
+def erase(board, rows, mode='fragments'):
+    """Erases full [rows] of the [board] and lets locked squares fall
+    according to the gravity [mode]."""
+    if mode not in modes:
+        raise UnknownGravityModeError(f"Unknown gravity mode '{mode}'.")
+    unsupported = board.erase_rows(rows)
+    if mode == 'fragments':
+        settle(board, unsupported)
+
+
+def settle(board, pieces=None):
+    """Lets [pieces] of locked squares on the [board] (dictionary of pieces
+    and rows, where they have a square, as returned by 'Board.erase_rows')
+    fall independently until they land on another piece or on the bottom of
+    the board, together with all the pieces, which lose their support by
+    that. Used after full lines are erased, when separated parts of shapes
+    lose their support. All the pieces on the board are let fall, if
+    [pieces] is None.
+
+    Pieces are processed from the bottom up and every piece moves only once,
+    straight to the place where it lands. When a piece moves, pieces standing
+    on it are processed again, so the result is the same as if all the pieces
+    kept falling one block at a time until nothing changes. Only cells of
+    the processed pieces are examined, see 'Board.piece_indices'.
+    Returns set of rows, which pieces have moved to - only these can become
+    full."""
+
+    no_columns = board.no_columns
+    no_cells = len(board.pieces)
+    cells = {}
+    # Heap of (-lowest cell, piece) - piece with the lowest square first
+    queue = []
+    queued = set()
+
+    def push(piece, row):
+        if piece not in queued:
+            queued.add(piece)
+            cells[piece] = board.piece_indices(piece, row)
+            heapq.heappush(queue, (-cells[piece][-1], piece))
+
+    if pieces is None:
+        pieces = {piece: indices[0] // no_columns - board.hidden_rows
+                  for piece, indices in board.piece_cells().items()}
+    for piece, row in pieces.items():
+        push(piece, row)
+
+    touched_rows = set()
+    while queue:
+        _, piece = heapq.heappop(queue)
+        queued.discard(piece)
+        indices = cells[piece]
+        plane = board.pieces
+        distance = 0
+        while True:
+            shift = (distance + 1) * no_columns
+            if any(index + shift >= no_cells
+                   or plane[index + shift] not in (0, piece)
+                   for index in indices):
+                break
+            distance += 1
+        if not distance:
+            continue
+        cells[piece] = board.move_piece(indices, distance)
+        plane = board.pieces
+        for index in cells[piece]:
+            touched_rows.add(index // no_columns - board.hidden_rows)
+        # Pieces right above the old position might have lost their support
+        for index in indices:
+            above = plane[index - no_columns] if index >= no_columns else 0
+            if above and above != piece:
+                push(above, (index - no_columns) // no_columns
+                     - board.hidden_rows)
+    return touched_rows
@@ -0,0 +1,170 @@
+"""Optional measuring of how long the game spends in its methods.
+
+'Instrumentation' replaces methods of a single game object by timed wrappers
+when it is attached and removes them when it is detached, so a game without
+instrumentation runs exactly the same code as before and pays nothing.
+Durations are collected in histograms with logarithmic buckets, so that
+recording a sample costs a few integer operations and memory does not grow
+with the length of the game."""
+
+import atexit
+import json
+import time
+
+
+class Histogram:
+    """Histogram of durations in nanoseconds.
+    Values are grouped into buckets by their highest 'sub_bits' bits, so that
+    every bucket is at most 1/2**(sub_bits - 1) of its values wide."""
+
+    sub_bits = 7
+
+    def __init__(self):
+        self.counts = [0] * (64 << Histogram.sub_bits)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        """Adds duration [value] in nanoseconds."""
+        exponent = value.bit_length() - Histogram.sub_bits
+        if exponent < 0:
+            exponent = 0
+        self.counts[(exponent << Histogram.sub_bits) + (value >> exponent)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Returns upper estimate of the [percent]-th percentile [ns]."""
+        if not self.count:
+            return 0
+        needed = self.count * percent / 100
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if count and cumulative >= needed:
+                exponent = index >> Histogram.sub_bits
+                mantissa = index & ((1 << Histogram.sub_bits) - 1)
+                return min(((mantissa + 1) << exponent) - 1, self.max)
+        return self.max
+
+    def summary(self):
+        """Returns dictionary with number of samples and mean, p50, p95, p99
+        and max durations in milliseconds."""
+        result = {'count': self.count,
+                  'mean': self.total / self.count / 1e6 if self.count else 0}
+        for percent in 50, 95, 99:
+            result[f'p{percent}'] = self.percentile(percent) / 1e6
+        result['max'] = self.max / 1e6
+        return result
+
+
+class Instrumentation:
+    """Measures durations of frames, time steps, handling of keys, erasing of
+    full lines, spawning of shapes and drawing (renderer's flushes) of a game
+    and counts frames, which came later than after 'Game.frame_interval' by
+    more than [drift_tolerance] milliseconds. Time steps themselves do not
+    drift, see module 'scheduler'."""
+
+    # Methods of the game, which are timed if the game has them
+    timed_methods = ['frame', 'time_step', 'key_pressed', 'perform_keys',
+                     'erase_full_lines', 'spawn_shape']
+
+    def __init__(self, drift_tolerance=5):
+        self.drift_tolerance = drift_tolerance
+        self.histograms = {}
+        # Intervals between scheduling of frames and frames themselves
+        self.intervals = Histogram()
+        self.frames = 0
+        self.drifted_frames = 0
+        self.game = None
+        self._wrapped = []          # (object, name of the wrapped method)
+        self._scheduled_at = None   # When the next frame was scheduled
+
+    def attach(self, game):
+        """Starts measuring the [game]."""
+        self.game = game
+        for name in Instrumentation.timed_methods:
+            if hasattr(game, name):
+                self._wrap(game, name, self._timed(name, getattr(game, name)))
+        if game.renderer is not None:
+            self._wrap(game.renderer, 'flush',
+                       self._timed('flush', game.renderer.flush))
+        if hasattr(game, 'schedule_frame'):
+            self._wrap(game, 'schedule_frame',
+                       self._scheduling(game.schedule_frame))
+            self._wrap(game, 'pause', self._pausing(game.pause))
+            self._wrap(game, 'frame', self._framing(game.frame))
+            # Keys are bound to methods, not to their names
+            if not game.paused:
+                game.bind_keys()
+
+    def detach(self):
+        """Stops measuring and restores original methods of the game."""
+        for object, name in reversed(self._wrapped):
+            object.__dict__.pop(name, None)
+        self._wrapped.clear()
+        if hasattr(self.game, 'bind_keys') and not self.game.paused:
+            self.game.bind_keys()
+        self.game = None
+
+    def _wrap(self, object, name, wrapper):
+        setattr(object, name, wrapper)
+        self._wrapped.append((object, name))
+
+    def _timed(self, name, method):
+        histogram = self.histograms.setdefault(name, Histogram())
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.add(clock() - start)
+        return timed
+
+    def _scheduling(self, method):
+        def scheduling(*args, **kwargs):
+            self._scheduled_at = time.perf_counter_ns()
+            return method(*args, **kwargs)
+        return scheduling
+
+    def _pausing(self, method):
+        def pausing(*args, **kwargs):
+            self._scheduled_at = None
+            return method(*args, **kwargs)
+        return pausing
+
+    def _framing(self, method):
+        def framing(*args, **kwargs):
+            if self._scheduled_at is not None:
+                interval = time.perf_counter_ns() - self._scheduled_at
+                self._scheduled_at = None
+                self.intervals.add(interval)
+                self.frames += 1
+                late = interval / 1e6 - self.game.frame_interval
+                if late > self.drift_tolerance:
+                    self.drifted_frames += 1
+            return method(*args, **kwargs)
+        return framing
+
+    def report(self):
+        """Returns dictionary with summaries of all histograms (see
+        'Histogram.summary') and numbers of scheduled and drifted frames."""
+        return {'methods': {name: histogram.summary()
+                            for name, histogram in self.histograms.items()},
+                'frame_intervals': self.intervals.summary(),
+                'frames': self.frames,
+                'drifted_frames': self.drifted_frames}
+
+    def dump(self, filename):
+        """Writes 'report' into the file [filename] as JSON."""
+        with open(filename, 'w') as file:
+            json.dump(self.report(), file, indent=1)
+
+    def dump_at_exit(self, filename):
+        """Makes the report be written into [filename] when program exits."""
+        atexit.register(self.dump, filename)
@@ -0,0 +1,172 @@
+"""Enumeration of all places, where a shape can land, meant for bots.
+
+Board states are tuples of row bitmasks - one integer per row including
+the hidden ones, where bit [column] is set if the block is occupied - see
+'Board.row_masks'. They are hashable, so results of the search are cached
+by the board state and a bot evaluating the same position again gets them
+without searching."""
+
+import collections
+import functools
+
+import shape as shp
+import board as brd
+import gravity
+
+
+# Final position of a shape:
+# - orientation - index to 'shape.orientations[type]',
+# - column      - leftmost column of the shape,
+# - cells       - tuple of (row, column) of its squares,
+# - rows        - board state after the shape locks and full lines are erased,
+# - lines       - number of erased lines,
+# - keys        - keys ('Engine.press') moving the shape there from the start.
+Placement = collections.namedtuple(
+    'Placement', ['orientation', 'column', 'cells', 'rows', 'lines', 'keys'])
+
+cache_size = 4096   # Number of searches remembered by 'placements'
+
+
+def _row_masks(offsets):
+    """Returns leftmost column offset, width and tuple of (row offset, bitmask
+    of squares in the row shifted to the leftmost column) of a shape with
+    squares at [offsets] from its rotation center."""
+    min_column = min(column for row, column in offsets)
+    width = max(column for row, column in offsets) - min_column + 1
+    masks = {}
+    for row, column in offsets:
+        masks[row] = masks.get(row, 0) | 1 << (column - min_column)
+    return min_column, width, tuple(sorted(masks.items()))
+
+
+# Row masks of all orientations of all shape types, see '_row_masks'
+row_masks = {type: [_row_masks(offsets) for offsets in shp.orientations[type]]
+             for type in shp.orientations}
+
+
+def spawn_state(type, j0):
+    """Returns (orientation, center row, center column) of a shape of the type
+    [type] spawned with the left column of the spawning box [j0]."""
+    offsets, (center_i, center_j), color = shp.shape_info[type]
+    return 0, -1 + center_i, j0 + center_j
+
+
+def placements(rows, no_columns, type, start=None):
+    """Returns tuple of all distinct placements ('Placement') of a shape of
+    the type [type] on the board [rows] ([no_columns] wide), which it can
+    reach from the state [start] (see 'spawn_state', shape spawned in
+    the middle of the board if it is None) by moving left, right, down and
+    rotating as in 'Shape.test_and_rotate'. Results are cached.
+    Resulting boards have full lines erased and rows above them moved down,
+    as in the gravity mode 'naive'. Separated parts of shapes falling further
+    (the mode 'fragments') can not be found out from row bitmasks, see
+    'settle'."""
+    if start is None:
+        start = spawn_state(type, no_columns // 2 - 1)
+    return _search(tuple(rows), no_columns, type, tuple(start))
+
+
+@functools.lru_cache(maxsize=cache_size)
+def _search(rows, no_columns, type, start):
+    # Breadth-first search over (orientation, center row, center column)
+    hidden_rows = brd.Board.hidden_rows
+    shape_orientations = shp.orientations[type]
+    kicks = shp.wall_kicks[type]
+    masks = row_masks[type]
+
+    def fits(state):
+        orientation, row, column = state
+        min_column, width, shape_rows = masks[orientation]
+        left = column + min_column
+        if left < 0 or left + width > no_columns:
+            return False
+        for d_row, mask in shape_rows:
+            r = row + d_row + hidden_rows
+            if r < 0 or r >= len(rows) or rows[r] & (mask << left):
+                return False
+        return True
+
+    if not fits(start):
+        return ()
+    parents = {start: None}     # State: (previous state, key)
+    queue = collections.deque([start])
+    landed = []
+    while queue:
+        state = queue.popleft()
+        orientation, row, column = state
+        moves = [('Left', (orientation, row, column - 1)),
+                 ('Right', (orientation, row, column + 1))]
+        if len(shape_orientations) > 1:
+            rotated = (orientation + 1) % len(shape_orientations)
+            for kick in kicks:
+                new_state = (rotated, row, column + kick)
+                if fits(new_state):
+                    moves.append(('Up', new_state))
+                    break
+        down = (orientation, row + 1, column)
+        if fits(down):
+            moves.append(('Down', down))
+        else:
+            landed.append(state)
+        for key, new_state in moves:
+            if new_state not in parents and fits(new_state):
+                parents[new_state] = (state, key)
+                queue.append(new_state)
+
+    result = []
+    seen = set()
+    for state in landed:
+        orientation, row, column = state
+        cells = tuple(sorted(shp.Shape.shift_positions(
+            shape_orientations[orientation], row, column)))
+        if cells in seen:
+            continue
+        seen.add(cells)
+        new_rows, lines = _lock(rows, no_columns, cells)
+        result.append(Placement(orientation, min(c for r, c in cells), cells,
+                                new_rows, lines, _keys(parents, state)))
+    return tuple(result)
+
+
+def settle(board, placement, type, mode='fragments'):
+    """Returns the [placement] of a shape of the type [type] with the board
+    state and number of erased lines as they are, when the shape locks on
+    the [board] ('board.Board') and full lines are erased according to
+    the gravity [mode] (see module 'gravity') until there are none, as in
+    'Engine.time_step'. It is simulated on a copy of the board, only if some
+    lines are erased."""
+    if not placement.lines:
+        return placement
+    board = board.copy()
+    board.lock(placement.cells, shp.type_codes[type])
+    lines = 0
+    full_rows = board.full_rows()
+    while full_rows:
+        lines += len(full_rows)
+        gravity.erase(board, full_rows, mode)
+        full_rows = board.full_rows()
+    return placement._replace(rows=board.row_masks(), lines=lines)
+
+
+def _lock(rows, no_columns, cells):
+    """Returns board state after squares [cells] lock and full lines are
+    erased, together with the number of erased lines. Rows above erased lines
+    move down, parts of shapes do not fall any further."""
+    hidden_rows = brd.Board.hidden_rows
+    new_rows = list(rows)
+    for row, column in cells:
+        new_rows[row + hidden_rows] |= 1 << column
+    full = (1 << no_columns) - 1
+    kept = new_rows[:hidden_rows] + [mask for mask in new_rows[hidden_rows:]
+                                     if mask != full]
+    lines = len(new_rows) - len(kept)
+    return tuple([0] * lines + kept), lines
+
+
+def _keys(parents, state):
+    keys = []
+    while parents[state] is not None:
+        state, key = parents[state]
+        keys.append(key)
+    keys.reverse()
+    return tuple(keys)
@@ -0,0 +1,327 @@
+"""Offscreen rendering of boards into RGB images without tkinter - for
+thumbnails of saved games and clips of recorded ones.
+
+A board is turned into a plane of type codes ('shape.type_codes', 0 for free
+blocks), which is what 'Board.colors' holds, with the active shape drawn
+over it. 'Rasterizer' builds one tile ('Square.a' pixels large by default)
+for every code in advance, colored as squares of that shape type in
+the window of the game. A frame is then only one NumPy indexing of rows of
+the tiles by the plane of codes, many frames at once are rendered the same
+way.
+Only the visible rows are drawn, as in the canvas of the game.
+
+Frames are written as RGB PNG files ('write_png') or as a raw stream of RGB
+frames one after another ('write_raw'), which can be turned into a video e.g.
+by:
+    ffmpeg -f rawvideo -pix_fmt rgb24 -s <width>x<height> -r 30 -i frames.rgb
+        clip.mp4
+
+Saved games ('render_files') and frames of replays ('render_replays') are
+rendered and encoded by a pool of processes.
+
+Usage (saved .tet games are rendered into one image each, other files are
+replay logs rendered into one image per time step or into a raw stream):
+    python raster.py --output directory [--block-size 30] [--processes N]
+        [--level 6] [--raw frames.rgb] file [file ...]
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+import board as brd
+import engine as eng
+import replay
+import savefile
+import shape as shp
+import square as sq
+
+
+class FrameSizeError(Exception): pass
+
+
+# Colors of the canvas of the game ('game.Game') and of shape types
+# ('shape.shape_info') as (red, green, blue), the same as tkinter uses
+rgb_colors = {
+    'black': (0, 0, 0),
+    'cyan': (0, 255, 255),
+    'blue': (0, 0, 255),
+    'orange': (255, 165, 0),
+    'green': (0, 255, 0),
+    'red': (255, 0, 0),
+    'yellow': (255, 255, 0),
+    'magenta': (255, 0, 255),
+}
+# Replay events, after which a frame is rendered
+frame_events = {'state', 'new', 'tick', 'key'}
+
+
+class Rasterizer:
+    """Renders boards [no_rows]x[no_columns] into RGB images (NumPy arrays
+    height x width x 3 of uint8) with squares [block_size] pixels large,
+    'Square.a' by default. Squares have a black [outline] pixels wide on their
+    upper and left side, so that neighbouring squares are separated as by
+    outlines of rectangles in the canvas."""
+
+    def __init__(self, no_rows=20, no_columns=15, block_size=None, outline=1,
+                 background='black'):
+        self.no_rows = no_rows
+        self.no_columns = no_columns
+        self.block_size = sq.Square.a if block_size is None else block_size
+        self.width = no_columns * self.block_size
+        self.height = no_rows * self.block_size
+        a = self.block_size
+        # Tile of every type code, tiles[0] is a free block
+        colors = [background] + shp.code_colors[1:]
+        self.tiles = np.empty((len(colors), a, a, 3), dtype=np.uint8)
+        for code, color in enumerate(colors):
+            self.tiles[code] = rgb_colors[color]
+            if code:
+                self.tiles[code, :outline] = rgb_colors['black']
+                self.tiles[code, :, :outline] = rgb_colors['black']
+        # Rows of pixels of the tiles, every row is one element, so that
+        # a frame is gathered a row of a tile at a time
+        self._tile_rows = self.tiles.reshape(len(colors), a, a * 3).view(
+            np.dtype((np.void, a * 3)))[..., 0]
+        self._pixel_rows = np.arange(a)[:, None]
+
+    def codes(self, engine):
+        """Returns plane of type codes of the visible rows of the [engine]'s
+        board with the active shape (rows x columns array of uint8)."""
+        board = engine.board
+        codes = np.frombuffer(board.colors, dtype=np.uint8).reshape(
+            self.no_rows + brd.Board.hidden_rows, self.no_columns).copy()
+        shape = engine.active_shape
+        if shape is not None:
+            code = shp.type_codes[shape.type]
+            for row, column in shape.coords:
+                codes[row + brd.Board.hidden_rows, column] = code
+        return codes[brd.Board.hidden_rows:]
+
+    def render_codes(self, codes):
+        """Returns image of the plane of type [codes] - one of them (rows x
+        columns) or many at once (frames x rows x columns)."""
+        codes = np.asarray(codes)
+        # Rows of pixels in the order of the image - (..., rows, pixel rows
+        # of a tile, columns)
+        image = self._tile_rows[codes[..., None, :], self._pixel_rows]
+        return image.view(np.uint8).reshape(codes.shape[:-2]
+                                            + (self.height, self.width, 3))
+
+    def render(self, engine):
+        """Returns image of the [engine]'s board with the active shape."""
+        return self.render_codes(self.codes(engine))
+
+
+def png_bytes(image, level=6):
+    """Returns RGB [image] (height x width x 3 array of uint8) encoded as
+    a PNG file with compression [level] (0 to 9). Rows are filtered by 'Up'
+    filter, so rows of a block identical to the previous one are all zeros."""
+
+    def chunk(type, data):
+        return (struct.pack('>I', len(data)) + type + data
+                + struct.pack('>I', zlib.crc32(type + data)))
+
+    height, width, _ = image.shape
+    rows = image.reshape(height, width * 3)
+    raw = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 0] = 2
+    raw[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=raw[1:, 1:])
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw, level))
+            + chunk(b'IEND', b''))
+
+
+def write_png(filename, image, level=6):
+    """Writes RGB [image] into PNG file [filename], see 'png_bytes'."""
+    with open(filename, 'wb') as file:
+        file.write(png_bytes(image, level))
+
+
+def write_raw(file, images):
+    """Writes RGB [images] (one of them or many at once) into binary [file]
+    as raw frames one after another. Returns number of written frames."""
+    images = np.ascontiguousarray(images)
+    file.write(memoryview(images).cast('B'))
+    return 1 if images.ndim == 3 else len(images)
+
+
+def replay_codes(player, rasterizer):
+    """Replays the log of the [player] ('replay.Player') as fast as possible
+    and yields planes of type codes (see 'Rasterizer.codes') after every event
+    changing the game, see 'frame_events'. The [rasterizer] has to be made for
+    the board of the log ('Player.size')."""
+    if player.size != (rasterizer.no_rows, rasterizer.no_columns):
+        message = f"Board {player.size[0]}x{player.size[1]} of the log does "
+        message += f"not match the rasterizer {rasterizer.no_rows}x"
+        message += f"{rasterizer.no_columns}."
+        raise FrameSizeError(message)
+    game = eng.Engine(*player.size)
+    for time, event, argument in player.events:
+        replay.Player.apply(game, event, argument)
+        if event in frame_events:
+            yield rasterizer.codes(game)
+
+
+# Rasterizers and engines of a worker process by board size and its settings
+_worker = {}
+
+
+def _start_worker(block_size, level):
+    _worker.update(block_size=block_size, level=level, rasterizers={},
+                   engines={})
+
+
+def _rasterizer(size):
+    rasterizers = _worker['rasterizers']
+    if size not in rasterizers:
+        rasterizers[size] = Rasterizer(*size, block_size=_worker['block_size'])
+    return rasterizers[size]
+
+
+def _render_file(task):
+    filename, output = task
+    with open(filename, 'rb') as file:
+        data = file.read()
+    size = savefile.board_size(data) or (20, 15)
+    engines = _worker['engines']
+    if size not in engines:
+        engines[size] = eng.Engine(*size)
+    game = engines[size]
+    game.is_game_over = False
+    game.clear()
+    if data.startswith(savefile.magic):
+        savefile.loads(game, data)
+    else:
+        savefile.loads_text(game, data.decode())
+    write_png(output, _rasterizer(size).render(game), _worker['level'])
+    return output
+
+
+def _render_frames(task):
+    size, outputs, codes = task
+    rasterizer = _rasterizer(size)
+    for output, frame in zip(outputs, codes):
+        write_png(output, rasterizer.render_codes(frame), _worker['level'])
+    return len(outputs)
+
+
+def _output(directory, filename, suffix):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(directory, name + suffix)
+
+
+def render_files(filenames, directory, block_size=None, processes=None,
+                 level=6):
+    """Renders saved games [filenames] (in any format, boards of text ones are
+    20x15) into PNG files with the same names in [directory] by [processes]
+    processes (as many as CPUs if None). Returns list of written files."""
+    tasks = [(filename, _output(directory, filename, '.png'))
+             for filename in filenames]
+    with multiprocessing.Pool(processes, _start_worker,
+                              (block_size, level)) as pool:
+        return list(pool.imap(_render_file, tasks, chunksize=16))
+
+
+def render_replays(filenames, directory, block_size=None, processes=None,
+                   level=6, batch=64):
+    """Renders frames of replay logs [filenames] into PNG files
+    <name>.<frame>.png in [directory]. Games are replayed in this process on
+    boards of their logs, planes of codes of frames are sent in batches of
+    [batch] to [processes] processes, which render and encode them. Returns
+    number of written frames."""
+
+    def tasks():
+        for filename in filenames:
+            player = replay.Player(filename)
+            rasterizer = Rasterizer(*player.size, block_size=block_size)
+            frames = enumerate(replay_codes(player, rasterizer))
+            while True:
+                chunk = list(itertools.islice(frames, batch))
+                if not chunk:
+                    break
+                outputs = [_output(directory, filename, f'.{index:06d}.png')
+                           for index, codes in chunk]
+                yield player.size, outputs, np.stack([codes for index, codes
+                                                      in chunk])
+
+    with multiprocessing.Pool(processes, _start_worker,
+                              (block_size, level)) as pool:
+        return sum(pool.imap(_render_frames, tasks()))
+
+
+def render_replays_raw(filenames, file, block_size=None, batch=16):
+    """Writes frames of replay logs [filenames] into binary [file] as a raw
+    stream of RGB frames, see 'write_raw'. All the logs have to be recorded
+    on boards of the same size, so that frames are of the same size. Frames
+    are rendered in batches of [batch], larger ones do not fit into CPU
+    caches, when squares are large. Returns the rasterizer and number of
+    written frames."""
+    rasterizer = None
+    count = 0
+    for filename in filenames:
+        player = replay.Player(filename)
+        if rasterizer is None:
+            rasterizer = Rasterizer(*player.size, block_size=block_size)
+        frames = replay_codes(player, rasterizer)
+        while True:
+            chunk = list(itertools.islice(frames, batch))
+            if not chunk:
+                break
+            count += write_raw(file, rasterizer.render_codes(np.stack(chunk)))
+    return rasterizer, count
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('files', nargs='+',
+                        help="saved games (.tet) or replay logs")
+    parser.add_argument('--output', default='.',
+                        help="directory of PNG files (default: current)")
+    parser.add_argument('--block-size', type=int, default=None,
+                        help=f"size of squares in pixels (default: "
+                             f"{sq.Square.a})")
+    parser.add_argument('--processes', type=int, default=None,
+                        help="number of processes (default: number of CPUs)")
+    parser.add_argument('--level', type=int, default=6,
+                        help="compression level of PNG files, 0 to 9 "
+                             "(default: 6)")
+    parser.add_argument('--raw', metavar='FILE',
+                        help="write frames of replays into FILE as raw RGB "
+                             "frames ('-' for stdout) instead of PNG files")
+    args = parser.parse_args(args)
+
+    games = [filename for filename in args.files
+             if filename.endswith('.tet')]
+    logs = [filename for filename in args.files
+            if not filename.endswith('.tet')]
+    os.makedirs(args.output, exist_ok=True)
+    if games:
+        written = render_files(games, args.output, args.block_size,
+                               args.processes, args.level)
+        print(f"{len(written)} saved games rendered", file=sys.stderr)
+    if logs and args.raw is not None:
+        if args.raw == '-':
+            rasterizer, count = render_replays_raw(logs, sys.stdout.buffer,
+                                                   args.block_size)
+        else:
+            with open(args.raw, 'wb') as file:
+                rasterizer, count = render_replays_raw(logs, file,
+                                                       args.block_size)
+        print(f"{count} frames {rasterizer.width}x{rasterizer.height} "
+              f"written", file=sys.stderr)
+    elif logs:
+        count = render_replays(logs, args.output, args.block_size,
+                               args.processes, args.level)
+        print(f"{count} frames rendered", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
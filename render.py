@@ -0,0 +1,129 @@
+import itertools
+import operator
+
+import square as sq
+import shape as shp
+
+
+class Renderer:
+    """Class used to draw squares into a tkinter canvas in batches.
+    Squares only report their changes to the renderer. Changes are collected
+    during a logical tick and drawn at once by 'flush' method, so that
+    the amount of work done by tkinter does not depend on how many times
+    squares have moved in the meantime.
+    Canvas items are not created and deleted with squares. They are borrowed
+    from a pool of hidden rectangles and returned to it, so drawing a square
+    costs the same during the whole game.
+    Squares are drawn [block_size] pixels large, 'Square.a' by default.
+    Locked squares of a board ('board.Board') are not objects, they are drawn
+    by cells of the board's color plane, which have changed since the last
+    flush, if the renderer has the board set."""
+
+    def __init__(self, canvas, pool_size=0, block_size=None):
+        self.canvas = canvas
+        self.block_size = sq.Square.a if block_size is None else block_size
+        self._tags = {}         # Canvas items of drawn squares
+        self._moved = set()     # Squares to be created or moved
+        self._recolored = set() # Squares, whose color has changed
+        self._deleted = []      # Canvas items of deleted squares
+        self._pool = []         # Hidden canvas items ready to be borrowed
+        # Board, whose locked squares are drawn as well, set by the engine
+        self.board = None
+        self._cell_tags = {}    # Index of a cell: canvas item of its square
+        self._drawn = None      # Board's colors, when they were last drawn
+        self._drawn_version = None
+        self.allocate(pool_size)
+
+    def allocate(self, count):
+        """Adds [count] hidden rectangles to the pool."""
+        for _ in range(count):
+            self._pool.append(self.canvas.create_rectangle(0, 0, 0, 0,
+                                                           state='hidden'))
+
+    def borrow(self, color):
+        """Returns a canvas item from the pool, which is shown and filled with
+        [color]. The pool grows if it is empty."""
+        if not self._pool:
+            self.allocate(1)
+        tag = self._pool.pop()
+        self.canvas.itemconfig(tag, state='normal', fill=color)
+        return tag
+
+    def give_back(self, tag):
+        """Hides canvas item [tag] and returns it to the pool."""
+        self.canvas.itemconfig(tag, state='hidden')
+        self._pool.append(tag)
+
+    def moved(self, square):
+        """Records that [square] has been created or moved."""
+        self._moved.add(square)
+
+    def recolored(self, square):
+        """Records that color of the [square] has changed."""
+        self._recolored.add(square)
+
+    def deleted(self, square):
+        """Records that [square] has been deleted."""
+        self._moved.discard(square)
+        self._recolored.discard(square)
+        tag = self._tags.pop(square, None)
+        if tag is not None:
+            self._deleted.append(tag)
+
+    def flush(self):
+        """Draws all the changes recorded since the last flush."""
+        canvas = self.canvas
+        a = self.block_size
+
+        for tag in self._deleted:
+            self.give_back(tag)
+        self._deleted.clear()
+        if self.board is not None:
+            self.draw_cells()
+
+        for square in self._moved:
+            # Upper left and lower right corner of the square
+            x0 = sq.Square.x + square.column * a
+            y0 = sq.Square.y + square.row * a
+            tag = self._tags.get(square)
+            if tag is None:
+                tag = self._tags[square] = self.borrow(square.color)
+                self._recolored.discard(square)
+            canvas.coords(tag, x0, y0, x0 + a, y0 + a)
+        self._moved.clear()
+
+        for square in self._recolored:
+            canvas.itemconfig(self._tags[square], fill=square.color)
+        self._recolored.clear()
+
+    def draw_cells(self):
+        """Draws locked squares of the board in cells, whose color has changed
+        since they were last drawn. Nothing is examined, if the board has not
+        changed."""
+        board = self.board
+        if board.version == self._drawn_version:
+            return
+        self._drawn_version = board.version
+        colors = board.colors
+        if self._drawn is None or len(self._drawn) != len(colors):
+            self._drawn = bytearray(len(colors))
+        canvas = self.canvas
+        a = self.block_size
+        for index in itertools.compress(itertools.count(),
+                                        map(operator.ne, self._drawn, colors)):
+            tag = self._cell_tags.pop(index, None)
+            code = colors[index]
+            if not code:
+                self.give_back(tag)
+                continue
+            color = shp.code_colors[code]
+            if tag is None:
+                tag = self.borrow(color)
+                row, column = divmod(index, board.no_columns)
+                x0 = sq.Square.x + column * a
+                y0 = sq.Square.y + (row - board.hidden_rows) * a
+                canvas.coords(tag, x0, y0, x0 + a, y0 + a)
+            else:
+                canvas.itemconfig(tag, fill=color)
+            self._cell_tags[index] = tag
+        self._drawn[:] = colors
@@ -0,0 +1,162 @@
+"""Recording of games and their replaying.
+
+A recording is an append-only text log with one event per line:
+    <time> <event> [argument]
+where time is number of milliseconds since the recording started and event
+is one of:
+- 'state' - position of the game (base64 of 'savefile.dumps') at the moment
+  recording started or a game was loaded,
+- 'seed'  - random generator choosing shape types was seeded by the argument,
+- 'gravity' - gravity mode of the game ('Engine.gravity_mode') is
+  the argument,
+- 'new'   - new game was started with seed given by the argument,
+- 'tick'  - time step, i.e. active shape fell or locked,
+- 'key'   - key given by the argument was pressed.
+As shape types are the only random part of the game, these events determine
+the whole game and it can be replayed either in real time in the window of
+the game or without a display as fast as possible.
+
+Usage (headless replay of logs, results are printed):
+    python replay.py log [log ...]
+"""
+
+import base64
+import sys
+import time
+
+import engine
+import savefile
+
+
+class UnknownReplayEventError(Exception): pass
+
+
+class Recorder:
+    """Appends events of a game to the log [filename].
+    Every event is written immediately, so that the log is complete even if
+    the program crashes."""
+
+    def __init__(self, filename):
+        self.file = open(filename, 'a', buffering=1)
+        self.start_time = time.monotonic()
+
+    def record(self, event, argument=None):
+        milliseconds = round((time.monotonic() - self.start_time) * 1000)
+        if argument is None:
+            self.file.write(f"{milliseconds} {event}\n")
+        else:
+            self.file.write(f"{milliseconds} {event} {argument}\n")
+
+    def record_state(self, game):
+        """Records current position of the [game]."""
+        data = base64.b64encode(savefile.dumps(game)).decode('ascii')
+        self.record('state', data)
+
+    def start(self, game):
+        """Records current position of the [game] and reseeds it, so that
+        following shape types can be reproduced."""
+        self.record_state(game)
+        self.record('gravity', game.gravity_mode)
+        game.reseed()
+        self.record('seed', game.seed)
+
+    def close(self):
+        self.file.close()
+
+
+class Player:
+    """Replays a log written by 'Recorder'."""
+
+    default_size = 20, 15   # Board of logs without any state, as of 'Engine'
+
+    def __init__(self, filename):
+        # List of events - (time [ms], event, argument or None)
+        self.events = []
+        with open(filename) as file:
+            for line in file:
+                parts = line.split()
+                if not parts:
+                    continue
+                argument = parts[2] if len(parts) > 2 else None
+                self.events.append((int(parts[0]), parts[1], argument))
+        # Board (rows, columns) of the first recorded state, games recorded
+        # with another size can not be replayed on the default board
+        self.size = None
+        for time, event, argument in self.events:
+            if event == 'state':
+                self.size = savefile.board_size(base64.b64decode(argument))
+                break
+        if self.size is None:
+            self.size = Player.default_size
+
+    @staticmethod
+    def apply(game, event, argument):
+        """Performs [event] with [argument] in the [game]. Methods of 'Engine'
+        are called directly, so that a displayed game neither schedules its
+        own time steps nor waits."""
+
+        if event == 'tick':
+            engine.Engine.time_step(game)
+        elif event == 'key':
+            game.press(argument)
+        elif event == 'seed':
+            game.reseed(int(argument))
+        elif event == 'gravity':
+            game.gravity_mode = argument
+        elif event == 'new':
+            engine.Engine.new_game(game, int(argument))
+        elif event == 'state':
+            game.is_game_over = False
+            game.clear()
+            savefile.loads(game, base64.b64decode(argument))
+        else:
+            message = f"Unknown replay event '{event}'."
+            raise UnknownReplayEventError(message)
+
+    def play(self, game=None):
+        """Replays the log as fast as possible in the [game] or in a new
+        headless 'Engine' with the board of the log ('size') if it is None.
+        Returns the game."""
+        if game is None:
+            game = engine.Engine(*self.size)
+        for time, event, argument in self.events:
+            Player.apply(game, event, argument)
+        return game
+
+    def play_in_game(self, game):
+        """Replays the log in real time in a displayed 'game.Game'.
+        Game's own time steps and keys are stopped, events are performed
+        at the times they were recorded."""
+        game.pause()
+        game.unbind_keys()
+        start_time = time.monotonic()
+
+        def play_from(index):
+            while index < len(self.events):
+                event_time, event, argument = self.events[index]
+                # Remaining time until the event
+                wait = event_time - round((time.monotonic() - start_time)
+                                          * 1000)
+                if wait > 0:
+                    game.canvas.after(wait, play_from, index)
+                    break
+                Player.apply(game, event, argument)
+                if event == 'state':
+                    game.display_next_shape(game.next_shape_type)
+                index += 1
+            game.update_labels()
+            game.renderer.flush()
+            game.update_ghost()
+
+        play_from(0)
+
+
+if __name__ == '__main__':
+    for filename in sys.argv[1:]:
+        start = time.perf_counter()
+        player = Player(filename)
+        game = player.play()
+        elapsed = time.perf_counter() - start
+        print(f"{filename}: {len(player.events)} events in {elapsed:.3f} s, "
+              f"points {game.points}, lines {game.deleted_lines}, "
+              f"level {game.level}, game over {game.is_game_over}")
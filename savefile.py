@@ -0,0 +1,316 @@
+import collections
+import struct
+
+import square as sq
+import shape as shp
+
+
+class UnknownSaveFormatError(Exception): pass
+
+
+# Binary .tet files start with these bytes. Files without them are read as
+# the original line-oriented text format.
+magic = b'TETB'
+version = 1
+# Header of binary files: magic, version, points, deleted lines, level, delay,
+# code of the next shape type, number of rows and columns, code of the active
+# shape type (0 if there is none), its rotation center (row, column), number
+# of its squares, number of cells occupied by locked squares and number of
+# bytes of a piece ID.
+header = struct.Struct('<4sBQIIIBIIBiiIIB')
+# Formats of piece IDs by their size
+id_formats = {1: 'B', 2: 'H', 4: 'I'}
+# Positions of set bits in every byte of the bitmap
+byte_bits = [[bit for bit in range(8) if value >> bit & 1]
+             for value in range(256)]
+# Header is followed by:
+# - bitmap of cells occupied by locked squares - one bit per cell, cells
+#   ordered row by row starting by the hidden row -2, least significant bit
+#   first,
+# - color plane - one byte per occupied cell, code of the piece's type,
+# - piece-ID plane - one, two or four bytes per occupied cell (as few as
+#   the number of pieces allows), index of the piece it belongs to,
+# both planes with occupied cells in the order of the bitmap,
+# - cells of the active shape - four bytes per square, index of its cell as
+#   in the bitmap.
+# The active shape is stored apart from locked squares, as its squares can
+# overlap them, when the game is over.
+active_format = 'I'
+
+# Saved game read and validated, before it is applied to an engine:
+# - stats       - (points, deleted lines, level, delay),
+# - active      - (type, rotation center, positions) of the active shape or
+#                 None,
+# - pieces      - list of (type code, positions) of pieces of locked squares.
+SavedGame = collections.namedtuple(
+    'SavedGame', ['stats', 'next_shape_type', 'active', 'pieces'])
+
+
+def save(engine, filename, binary=True):
+    """Saves state of the [engine] into file [filename] in the binary format
+    or in the text one, if [binary] is False."""
+    if binary:
+        with open(filename, 'wb') as file:
+            file.write(dumps(engine))
+    else:
+        with open(filename, 'w') as file:
+            file.write(dumps_text(engine))
+
+
+def load(engine, filename):
+    """Loads state of the [engine] from file [filename] in any format.
+    The engine has to be cleared before."""
+    apply(engine, read(engine, filename))
+
+
+def read(engine, filename):
+    """Returns saved game ('SavedGame') from file [filename] in any format
+    for the [engine], which is not changed. Raises exception if the file is
+    not a valid saved game for the engine."""
+    with open(filename, 'rb') as file:
+        data = file.read()
+    if data.startswith(magic):
+        return parse(engine, data)
+    return parse_text(engine, data.decode())
+
+
+def apply(engine, saved):
+    """Sets state of the cleared [engine] to the [saved] game ('SavedGame')."""
+    engine.points, engine.deleted_lines, engine.level, engine.delay = (
+        saved.stats)
+    engine.next_shape_type = saved.next_shape_type
+    for code, positions in saved.pieces:
+        engine.board.lock(positions, code)
+    if saved.active is not None:
+        type, (row, column), positions = saved.active
+        shape = engine.new_shape(type, empty=True)
+        for position in positions:
+            shape.add_square(sq.Square(engine.renderer, *position,
+                                       shape.color))
+        shape.rotation_center = [row, column]
+        engine.active_shape = shape
+
+
+def board_size(data):
+    """Returns (rows, columns) of the board of the saved game [data] or None
+    if it is not known (the text format does not store it)."""
+    if data.startswith(magic):
+        fields = header.unpack_from(data)
+        return fields[7], fields[8]
+    return None
+
+
+def dumps(engine):
+    """Returns state of the [engine] in the binary format."""
+
+    board = engine.board
+    hidden_rows = board.hidden_rows
+    no_columns = engine.no_columns
+    no_cells = (engine.no_rows + hidden_rows) * no_columns
+
+    active = engine.active_shape
+    if active is not None:
+        active_code = shp.type_codes[active.type]
+        center_row, center_column = active.rotation_center
+        active_cells = sorted((row + hidden_rows) * no_columns + column
+                              for row, column in active.coords)
+    else:
+        active_code = center_row = center_column = 0
+        active_cells = []
+
+    # ID of the piece for every cell occupied by locked squares
+    pieces = board.piece_cells()
+    cells = {}
+    for piece_id, indices in enumerate(pieces.values()):
+        for index in indices:
+            cells[index] = piece_id
+
+    bitmap = bytearray((no_cells + 7) // 8)
+    indices = sorted(cells)
+    for index in indices:
+        bitmap[index >> 3] |= 1 << (index & 7)
+    colors = bytes(board.colors[index] for index in indices)
+    id_size = min(size for size in id_formats if len(pieces) <= 256 ** size)
+    ids = struct.pack(f'<{len(indices)}{id_formats[id_size]}',
+                      *(cells[index] for index in indices))
+    active_data = struct.pack(f'<{len(active_cells)}{active_format}',
+                              *active_cells)
+
+    head = header.pack(magic, version, engine.points, engine.deleted_lines,
+                       engine.level, engine.delay,
+                       shp.type_codes[engine.next_shape_type],
+                       engine.no_rows, no_columns, active_code,
+                       center_row, center_column, len(active_cells),
+                       len(indices), id_size)
+    return head + bytes(bitmap) + colors + ids + active_data
+
+
+def loads(engine, data):
+    """Loads state of the cleared [engine] from [data] in the binary
+    format."""
+    apply(engine, parse(engine, data))
+
+
+def _code_type(code):
+    if not 0 < code < len(shp.code_types):
+        raise UnknownSaveFormatError(f"Unknown shape type code {code}.")
+    return shp.code_types[code]
+
+
+def parse(engine, data):
+    """Returns saved game ('SavedGame') for the [engine] from [data] in
+    the binary format. The engine is not changed."""
+
+    if len(data) < header.size:
+        raise UnknownSaveFormatError("Saved game is truncated.")
+    (file_magic, file_version, points, deleted_lines, level, delay,
+     next_code, no_rows, no_columns, active_code, center_row, center_column,
+     no_active, no_occupied, id_size) = header.unpack_from(data)
+    if file_magic != magic or file_version != version:
+        message = f"Unsupported save format version {file_version}."
+        raise UnknownSaveFormatError(message)
+    if (no_rows, no_columns) != (engine.no_rows, engine.no_columns):
+        message = f"Saved board {no_rows}x{no_columns} does not match "
+        message += f"the game board {engine.no_rows}x{engine.no_columns}."
+        raise UnknownSaveFormatError(message)
+    if id_size not in id_formats:
+        raise UnknownSaveFormatError(f"Unsupported shape ID size {id_size}.")
+
+    hidden_rows = engine.board.hidden_rows
+    no_cells = (no_rows + hidden_rows) * no_columns
+    id_format = id_formats[id_size]
+    bitmap_size = (no_cells + 7) // 8
+    size = (header.size + bitmap_size + no_occupied * (1 + id_size)
+            + no_active * struct.calcsize(active_format))
+    if len(data) < size:
+        raise UnknownSaveFormatError("Saved game is truncated.")
+    offset = header.size
+    bitmap = data[offset:offset + bitmap_size]
+    offset += bitmap_size
+    if int.from_bytes(bitmap, 'little').bit_count() != no_occupied:
+        message = "Occupied cells do not match the bitmap of the board."
+        raise UnknownSaveFormatError(message)
+    colors = data[offset:offset + no_occupied]
+    offset += no_occupied
+    ids = struct.unpack_from(f'<{no_occupied}{id_format}', data, offset)
+    offset += no_occupied * id_size
+    active_cells = struct.unpack_from(f'<{no_active}{active_format}', data,
+                                      offset)
+    if any(index >= no_cells for index in active_cells):
+        raise UnknownSaveFormatError("Active shape is outside the board.")
+
+    # Grouping occupied cells by pieces
+    pieces = {}
+    occupied = 0
+    for byte_index, byte in enumerate(bitmap):
+        if not byte:
+            continue
+        for bit in byte_bits[byte]:
+            row, column = divmod(byte_index * 8 + bit, no_columns)
+            piece_id = ids[occupied]
+            if piece_id not in pieces:
+                pieces[piece_id] = (colors[occupied], [])
+            pieces[piece_id][1].append((row - hidden_rows, column))
+            occupied += 1
+    for code, positions in pieces.values():
+        _code_type(code)
+
+    active = None
+    if active_code:
+        positions = []
+        for index in active_cells:
+            row, column = divmod(index, no_columns)
+            positions.append((row - hidden_rows, column))
+        active = (_code_type(active_code), (center_row, center_column),
+                  positions)
+    return SavedGame((points, deleted_lines, level, delay),
+                     _code_type(next_code), active, list(pieces.values()))
+
+
+def dumps_text(engine):
+    """Returns state of the [engine] in the text format."""
+
+    # Game stats
+    lines = [str(engine.points), str(engine.deleted_lines), str(engine.level),
+             str(engine.delay), '']
+    # Next shape type
+    lines += [engine.next_shape_type, '']
+
+    # Active shape info
+    active = engine.active_shape
+    if active is not None:
+        lines.append(active.type)
+        row, column = active.rotation_center
+        lines.append(str(row) + ' ' + str(column))
+        for square in active.squares:
+            lines.append(str(square.row) + ' ' + str(square.column))
+    else:
+        lines.append("None")
+    lines += ['', '']
+
+    # Other shapes info - pieces of locked squares
+    board = engine.board
+    for indices in board.piece_cells().values():
+        lines.append(shp.code_types[board.colors[indices[0]]])
+        for index in indices:
+            row, column = divmod(index, engine.no_columns)
+            lines.append(str(row - board.hidden_rows) + ' ' + str(column))
+        lines.append('')
+    return '\n'.join(lines) + '\n'
+
+
+def loads_text(engine, text):
+    """Loads state of the cleared [engine] from [text] in the text format."""
+    apply(engine, parse_text(engine, text))
+
+
+def _test_type(type):
+    if type not in shp.type_codes:
+        raise shp.UnknownShapeTypeError(f"Shape type '{type}' unknown.")
+    return type
+
+
+def parse_text(engine, text):
+    """Returns saved game ('SavedGame') for the [engine] from [text] in
+    the text format. The engine is not changed."""
+
+    lines = iter(text.splitlines())
+    try:
+        # Game stats
+        stats = tuple(int(next(lines)) for _ in range(4))
+
+        # Next shape type
+        next(lines)
+        next_shape_type = _test_type(next(lines).strip())
+        next(lines)
+
+        # Active shape
+        active = None
+        type = next(lines).strip()
+        if type != "None":
+            row, column = next(lines).split()
+            active = (_test_type(type), (int(row), int(column)),
+                      _load_positions(engine, lines))
+    except StopIteration:
+        raise UnknownSaveFormatError("Saved game is truncated.") from None
+
+    # Other shapes - pieces of locked squares
+    pieces = []
+    for line in lines:
+        type = line.strip()
+        if type:
+            pieces.append((shp.type_codes[_test_type(type)],
+                           _load_positions(engine, lines)))
+    return SavedGame(stats, next_shape_type, active, pieces)
+
+
+def _load_positions(engine, lines):
+    """Returns list of positions given by [lines] up to the first empty one."""
+    positions = []
+    for line in lines:
+        if not line.strip():
+            break
+        row, column = map(int, line.split())
+        engine.board.test_position(row, column)
+        positions.append((row, column))
+    return positions
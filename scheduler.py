@@ -0,0 +1,79 @@
+"""Timing of the game independent of how late the event loop calls it.
+
+'Scheduler' turns real time measured by a monotonic clock into a whole
+number of fixed logical steps, remainder is kept for the next time. Logic of
+the game advances by these steps, so it runs at the same speed however long
+drawing took or however irregularly the event loop woke the game up.
+'KeyRepeat' repeats held keys in the logical time (delayed auto shift and
+auto repeat) without relying on key repeating of the operating system."""
+
+import time
+
+
+class Scheduler:
+    """Fixed-timestep clock. Logical steps are [step] milliseconds long.
+    If the game falls more than [max_steps] steps behind (e.g. the window was
+    dragged), the rest of the time is dropped instead of being caught up."""
+
+    def __init__(self, step=10, max_steps=25, clock=time.monotonic):
+        self.step = step
+        self.max_steps = max_steps
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        """Starts measuring time from now on, e.g. after pause."""
+        self.last_time = self.clock()
+        self.accumulator = 0
+
+    def advance(self):
+        """Returns number of logical steps to perform since the last call."""
+        now = self.clock()
+        self.accumulator += (now - self.last_time) * 1000
+        self.last_time = now
+        steps = int(self.accumulator // self.step)
+        if steps > self.max_steps:
+            steps = self.max_steps
+            self.accumulator = 0
+        else:
+            self.accumulator -= steps * self.step
+        return steps
+
+
+class KeyRepeat:
+    """Held keys repeating after delay [das] milliseconds every [arr]
+    milliseconds (at least 1). Only keys pressed with repeat=True repeat,
+    others are just remembered as held."""
+
+    def __init__(self, das=170, arr=50):
+        self.das = das
+        self.arr = max(1, arr)
+        self.held = {}  # Key: time until its next repeat or None
+
+    def press(self, key, repeat=True):
+        """Marks [key] as held. Returns False if it already has been held,
+        so the press is a repeat and should be ignored."""
+        if key in self.held:
+            return False
+        self.held[key] = self.das if repeat else None
+        return True
+
+    def release(self, key):
+        self.held.pop(key, None)
+
+    def clear(self):
+        self.held.clear()
+
+    def advance(self, step):
+        """Advances time by [step] milliseconds. Returns list of keys, which
+        repeat during the step, in the order of repeats."""
+        repeated = []
+        for key, remaining in self.held.items():
+            if remaining is None:
+                continue
+            remaining -= step
+            while remaining <= 0:
+                repeated.append(key)
+                remaining += self.arr
+            self.held[key] = remaining
+        return repeated
@@ -0,0 +1,218 @@
+"""Headless game server hosting many independent games at once.
+
+Every session is a game ('engine.Engine') with its own time steps scheduled
+by asyncio. Clients connect over TCP or a Unix socket and send requests, one
+per line, every request gets one line of response starting by 'ok' or
+'error':
+    new [seed] [rows] [columns] [speed]  -> ok <session>
+        starts a game, time steps come 'speed' times faster than in the game,
+    key <session> <key> [count]          -> ok
+        presses key ('Left', 'Right', 'Up', 'Down', 'space'),
+    state <session>                      -> ok <points> <lines> <level>
+                                               <game over 0/1> <active type>
+                                               <next type> <rows>
+        rows are hexadecimal bitmasks of occupied blocks separated by ',',
+        see 'Board.row_masks',
+    close <session>                      -> ok
+    stats                                -> ok <JSON>
+    watch <session>                      -> ok
+        from then on the connection carries only frames of the session (see
+        module 'stream'), each preceded by its length (4 bytes, little-endian),
+Sessions are closed when the connection, which started them, closes.
+
+Usage:
+    python server.py [--host HOST] [--port PORT] [--unix PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import struct
+import time
+
+import board as brd
+import engine
+import instrument
+import stream
+
+
+class ServerRequestError(Exception): pass
+
+
+class Session:
+    """Game played on the server with time steps every 'delay' / [speed]
+    milliseconds."""
+
+    def __init__(self, server, seed=None, no_rows=20, no_columns=15, speed=1):
+        if speed <= 0:
+            raise ServerRequestError("Speed has to be positive.")
+        self.server = server
+        self.engine = engine.Engine(no_rows, no_columns, seed=seed)
+        self.speed = speed
+        # Spectators watching the session
+        self.broadcaster = stream.Broadcaster()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        """Performs time steps until the game is over. Time steps are planned
+        from the start of the game, not from the previous one, so that delays
+        of the event loop do not slow the game down."""
+        loop = asyncio.get_running_loop()
+        clock = time.perf_counter_ns
+        server = self.server
+        next_time = loop.time()
+        while not self.engine.is_game_over:
+            next_time += self.engine.delay / 1000 / self.speed
+            await asyncio.sleep(next_time - loop.time())
+            start = clock()
+            server.tick_lateness.add(max(0, int((loop.time() - next_time)
+                                                * 1e9)))
+            self.engine.time_step()
+            self.broadcaster.publish(self.engine)
+            server.tick_durations.add(clock() - start)
+            server.ticks += 1
+
+    def state(self):
+        game = self.engine
+        active = game.active_shape
+        rows = ','.join(format(mask, 'x') for mask in game.board.row_masks())
+        return (f"{game.points} {game.deleted_lines} {game.level} "
+                f"{int(game.is_game_over)} "
+                f"{active.type if active is not None else '-'} "
+                f"{game.next_shape_type} {rows}")
+
+    def close(self):
+        self.task.cancel()
+
+
+class Server:
+    """Hosts sessions and answers requests of connected clients."""
+
+    max_buffered = 1 << 16  # Bytes waiting for a spectator, before it skips
+
+    def __init__(self):
+        self.sessions = {}
+        self.last_id = 0
+        self.ticks = 0
+        self.requests = 0
+        # How late time steps came and how long they took [ns]
+        self.tick_lateness = instrument.Histogram()
+        self.tick_durations = instrument.Histogram()
+        self.start_time = time.monotonic()
+        self.start_cpu = time.process_time()
+
+    def session(self, id):
+        session = self.sessions.get(int(id))
+        if session is None:
+            raise ServerRequestError(f"Unknown session {id}.")
+        return session
+
+    def request(self, line, owned, send=None):
+        """Returns response to the request [line]. Sessions started by
+        the request are added to the set [owned], function [send] sending
+        frames to the client subscribes to a watched session."""
+        self.requests += 1
+        words = line.split()
+        if not words:
+            raise ServerRequestError("Empty request.")
+        command, arguments = words[0], words[1:]
+
+        if command == 'key':
+            key = arguments[1]
+            count = int(arguments[2]) if len(arguments) > 2 else 1
+            if not self.session(arguments[0]).engine.press(key, count):
+                raise ServerRequestError(f"Unknown key {key}.")
+            return 'ok'
+        if command == 'state':
+            return 'ok ' + self.session(arguments[0]).state()
+        if command == 'new':
+            numbers = [int(argument) for argument in arguments[:3]]
+            speed = float(arguments[3]) if len(arguments) > 3 else 1
+            self.last_id += 1
+            self.sessions[self.last_id] = Session(self, *numbers, speed=speed)
+            owned.add(self.last_id)
+            return f'ok {self.last_id}'
+        if command == 'close':
+            id = int(arguments[0])
+            self.session(id).close()
+            del self.sessions[id]
+            owned.discard(id)
+            return 'ok'
+        if command == 'watch':
+            self.session(arguments[0]).broadcaster.subscribe(send)
+            return 'ok'
+        if command == 'stats':
+            return 'ok ' + json.dumps(self.stats())
+        raise ServerRequestError(f"Unknown command {command}.")
+
+    def stats(self):
+        """Returns dictionary with numbers of sessions, time steps and
+        requests, CPU time used by the server and summaries of lateness and
+        durations of time steps (see 'Histogram.summary')."""
+        return {'sessions': len(self.sessions),
+                'running': sum(not session.engine.is_game_over
+                               for session in self.sessions.values()),
+                'ticks': self.ticks,
+                'requests': self.requests,
+                'wall_time': time.monotonic() - self.start_time,
+                'cpu_time': time.process_time() - self.start_cpu,
+                'tick_lateness': self.tick_lateness.summary(),
+                'tick_durations': self.tick_durations.summary()}
+
+    async def handle(self, reader, writer):
+        """Serves one connected client."""
+        owned = set()
+
+        def send(frame):
+            # Slow spectators skip frames and get a keyframe later
+            if writer.transport.get_write_buffer_size() > self.max_buffered:
+                return False
+            writer.write(struct.pack('<I', len(frame)) + frame)
+            return True
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = self.request(line.decode(), owned, send)
+                except (ServerRequestError, brd.BoardSizeError, ValueError,
+                        IndexError) as error:
+                    response = f'error {type(error).__name__}: {error}'
+                writer.write(response.encode() + b'\n')
+                await writer.drain()
+                if line.startswith(b'watch') and response == 'ok':
+                    # Only frames are sent from now on
+                    await reader.read()
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            for session in self.sessions.values():
+                session.broadcaster.unsubscribe(send)
+            for id in owned:
+                # Other connections can have closed the session already
+                session = self.sessions.pop(id, None)
+                if session is not None:
+                    session.close()
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=7777, path=None):
+        """Serves clients on a Unix socket [path] or on TCP [host]:[port]
+        until cancelled."""
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Headless Tetris server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--unix', metavar='PATH', help="serve on Unix socket")
+    args = parser.parse_args()
+    asyncio.run(Server().serve(args.host, args.port, args.unix))
@@ -5,59 +5,62 @@ class UnknownShapeTypeError(Exception): pass
 class UnknownMovementDirectionErrror(Exception): pass
 
 
+# Individual shape types with important information about them:
+# - spawning coordinates of squares and of the rotation center as offsets from
+#   (i0, j0) - lower left corner of an 2x4 box, where shapes spawn,
+# - color.
+shape_info = {
+    'I': ([(0,0), (0,1), (0,2), (0,3)], (0,2), 'cyan'),
+    'J': ([(-1,0), (0,0), (0,1), (0,2)], (0,1), 'blue'),
+    'L': ([(0,0), (0,1), (0,2), (-1,2)], (0,1), 'orange'),
+    'S': ([(0,0), (0,1), (-1,1), (-1,2)], (-1,1), 'green'),
+    'Z': ([(-1,0), (-1,1), (0,1), (0,2)], (-1,1), 'red'),
+    'O': ([(0,1), (-1,1), (0,2), (-1,2)], (-1,1), 'yellow'),
+    'T': ([(0,0), (0,1), (-1,1), (0,2)], (0,1), 'magenta'),
+}
+
+# Codes of shape types used where types are stored as numbers, 0 means none
+type_codes = {type: code for code, type in enumerate(shape_info, 1)}
+code_types = [None] + list(shape_info)
+# Colors of shape types by their codes, e.g. of locked squares of a board
+code_colors = [None] + [color for offsets, center, color
+                        in shape_info.values()]
+
+
 class Shape():
     """Class used to handle individual shapes in a game.
-    See its methods for more information."""
-    primary_canvas = None   # Where everything important takes place
+    See its methods for more information.
+    Positions of squares are cached (see 'coords') and shapes have no instance
+    dictionary, so that games with many shapes stay small and fast."""
+
+    __slots__ = ('_type', '_renderer', '_rotation_center', '_orientation',
+                 '_color', '_squares', '_coords')
 
-    def __init__(self, type, i0=-1 , j0=6, canvas=None, empty=False):
+    def __init__(self, type, i0=-1 , j0=6, renderer=None, empty=False):
         self._type = type    # One of 'I', 'J', 'L', 'S', 'Z', 'O', 'T'
-        if canvas is None:
-            self._canvas = Shape.primary_canvas
-        else:
-            self._canvas = canvas
-
-        # Individual shape types with important information about them
-        # 'squares_coords' are spawning coordinates of shapes, dependent of
-        # (i0, j0) - lower left corner of an 2x4 box, where they spawn.
-        if self._type == 'I':
-            squares_coords = [(i0,j0), (i0,j0+1), (i0,j0+2), (i0,j0+3)]
-            rotation_center = [i0, j0+2]
-            color = 'cyan'
-        elif self._type == 'J':
-            squares_coords = [(i0-1,j0), (i0,j0), (i0,j0+1), (i0,j0+2)]
-            rotation_center = [i0, j0+1]
-            color = 'blue'
-        elif self._type == 'L':
-            squares_coords = [(i0,j0), (i0,j0+1), (i0,j0+2), (i0-1,j0+2)]
-            rotation_center = [i0, j0+1]
-            color = 'orange'
-        elif self._type == 'S':
-            squares_coords = [(i0,j0), (i0,j0+1), (i0-1,j0+1), (i0-1,j0+2)]
-            rotation_center = [i0-1, j0+1]
-            color = 'green'
-        elif self._type == 'Z':
-            squares_coords = [(i0-1,j0), (i0-1,j0+1), (i0,j0+1), (i0,j0+2)]
-            rotation_center = [i0-1, j0+1]
-            color = 'red'
-        elif self._type == 'O':
-            squares_coords = [(i0,j0+1), (i0-1,j0+1), (i0,j0+2), (i0-1,j0+2)]
-            rotation_center = [i0-1, j0+1]
-            color = 'yellow'
-        elif self._type == 'T':
-            squares_coords = [(i0,j0), (i0,j0+1), (i0-1,j0+1), (i0,j0+2)]
-            rotation_center = [i0, j0+1]
-            color = 'magenta'
-        else:
+        # Renderer drawing shape's squares, see 'render.Renderer'. None means
+        # they are not drawn, which is used when the game runs without
+        # a display.
+        self._renderer = renderer
+
+        if self._type not in shape_info:
             message = f"Shape type '{self._type}' unknown."
             raise UnknownShapeTypeError(message)
+        offsets, (center_i, center_j), color = shape_info[self._type]
+        squares_coords = Shape.shift_positions(offsets, i0, j0)
+        rotation_center = [i0 + center_i, j0 + center_j]
 
         self._rotation_center = rotation_center # Needed only until shape locks
+        # Index to 'orientations[type]', None if it has to be found out again
+        self._orientation = 0
         self._color = color
         self._squares = set()
+        # Tuple of positions of squares, None if it has to be built again
+        self._coords = None
         if not empty:
             for i, j in squares_coords:
-                self._squares.add(sq.Square(self._canvas, i, j, self._color))
+                self._squares.add(sq.Square(self._renderer, i, j,
+                                            self._color))
 
     def is_at(self, row, column):
         """Returns True/False, whether one of the shape's squares is at
@@ -68,11 +71,11 @@ class Shape():
                 return True
         return False
 
-    def can_move(self, where, all_shapes):
+    def can_move(self, where, board):
         """Does a check, wheter movement in a direction [where] is possible or
         not. Returns False in case of another object in the way or row/column
-        number out of limit. Takes list of all shapes in the game as an
-        argument."""
+        number out of limit. Takes occupancy grid of the game ('board.Board')
+        as an argument."""
 
         if where == '<down>':
             row_dif = 1
@@ -90,7 +93,7 @@ class Shape():
         # Calling can_move_to function checks whether there is another shape
         # in the direction of movement and row and column numbers are valid.
         new_positions = Shape.shift_positions(self.coords, row_dif, column_dif)
-        return self.can_move_to(new_positions, all_shapes)
+        return self.can_move_to(new_positions, board)
 
     def move(self, where):
         """Moves a shape one block without checking if it is possible, i.e.
@@ -112,112 +115,95 @@ class Shape():
             message = f"Unknown movement direction {where}."
             raise UnknownMovementDirectionErrror(message)
 
+        self.shift(row_diff, column_diff)
+
+    def shift(self, row_diff, column_diff):
+        """Moves a shape by [row_diff] rows and [column_diff] columns at once
+        without checking if it is possible. See 'move' method."""
+
         for square in self._squares:
-            if row_diff != 0:
-                square.row += row_diff
-            if column_diff != 0:
-                square.column += column_diff
+            square.move_to(square.row + row_diff, square.column + column_diff)
+        self._coords = None
 
         self._rotation_center[0] += row_diff
         self._rotation_center[1] += column_diff
-        self._canvas.update()
 
-    def test_and_move(self, where, all_shapes):
+    def drop_distance(self, board):
+        """Returns number of blocks, by which the shape can fall until it lands
+        on another shape or on the bottom of the [board]."""
+
+        coords = self.coords
+        distance = 0
+        while all(board.is_free(row + distance + 1, column, ignore=self)
+                  for row, column in coords):
+            distance += 1
+        return distance
+
+    def test_and_move(self, where, board):
         """Combines 'can_move' and 'move' methods - firstly checks if the move
         is possible and if it is, the move is performed.
         Returns True/False whether the move was successful."""
 
-        if self.can_move(where, all_shapes):
+        if self.can_move(where, board):
             self.move(where)
             return True
         else:
             return False
 
-    def test_and_rotate(self, all_shapes):
+    def test_and_rotate(self, board):
         """Tests, whether rotating a shape is possible and rotates the shape,
-        if it is.
+        if it is. Positions after rotation are looked up in 'orientations'
+        and shifts tried in case of a collision in 'wall_kicks'.
         Returns True/False whether the rotation was successful."""
 
-        rc = self._rotation_center
-
-        # New positions, which shape should occupy after rotation
-        new_positions = []
-        if self._type == 'I':
-            # In-game rotation of 'I' shape is not a rotation in a ususal sense,
-            # it is rather a change of vertical and horizontal position.
-            # See Nintendo Rotation System for more information.
-            i, j = rc
-            if self.is_at(i, j-1):  # Shape in horizontal position
-                new_positions.append((i-2,j))
-                new_positions.append((i-1,j))
-                new_positions.append((i,j))
-                new_positions.append((i+1,j))
-            else:                   # Shape in vertical position
-                new_positions.append((i,j-2))
-                new_positions.append((i,j-1))
-                new_positions.append((i,j))
-                new_positions.append((i,j+1))
-        elif self._type == 'O':
+        shape_orientations = orientations[self._type]
+        if len(shape_orientations) == 1:
             # Rotating 'O' shape does not change anything.
             return True
+        orientation = self.orientation
+        if orientation is None:
+            # Shape is not a whole tetromino, e.g. a part of a divided shape
+            return False
+        orientation = (orientation + 1) % len(shape_orientations)
+
+        row, column = self._rotation_center
+        for kick in wall_kicks[self._type]:
+            new_positions = Shape.shift_positions(
+                shape_orientations[orientation], row, column + kick)
+            if self.can_move_to(new_positions, board):
+                break
         else:
-            # Other shapes rotate in a 3x3 box
-            positions = []
-            for square in self._squares:
-                positions.append(tuple(square.coords))
-            new_positions = Shape.rotate_positions(positions, rc)
-
-        # Checks if there is another shape in the direction of movement and if
-        # row and column number are valid. In case one of the conditions is not
-        # satisfied, wall kick is tried: rotation is tried after moving
-        # the shape one block left/right.
-        if not self.can_move_to(new_positions, all_shapes):
-            new_positions = Shape.shift_positions(new_positions, 0, -1)
-            self._rotation_center[1] += -1
-            if not self.can_move_to(new_positions, all_shapes):
-                new_positions = Shape.shift_positions(new_positions, 0, 2)
-                self._rotation_center[1] += 2
-                if not self.can_move_to(new_positions, all_shapes):
-                    # As 'I' shape has different rotation system, in case of
-                    # the wall on the left, moving 2 block to the right has to
-                    # be tried as well.
-                    if self._type == 'I':
-                        new_positions = Shape.shift_positions(new_positions,
-                                                              0, 1)
-                        self._rotation_center[1] += 1
-                        if not self.can_move_to(new_positions, all_shapes):
-                            return False
-                    else:
-                        return False
-
-        for i, square in enumerate(self._squares):
-            square.move_to(*new_positions[i])
-        self._canvas.update()
+            return False
+
+        for square, position in zip(self._squares, new_positions):
+            square.move_to(*position)
+        self._coords = None
+        self._rotation_center[1] += kick
+        self._orientation = orientation
         return True
 
-    def can_move_to(self, new_positions, all_shapes):
+    def can_move_to(self, new_positions, board):
         """Auxiliary method that checks if moving of the shape's squares to
         new_positions is possible, i.e. whether new row and column numbers are
-        valid and there is no other shape."""
-
-        if len(all_shapes) > 0:
-            for row, column in new_positions:
-                for shape in all_shapes - {self}:
-                    if shape.is_at(row, column):
-                        return False
-                try:
-                    sq.Square.test_row_and_column(row, column)
-                except (RowNumberOutOfLimitError, ColumnNumberOutOfLimitError):
-                    return False
+        valid and there is no other shape.
+        Every position is answered by a single lookup in the [board]."""
+
+        for row, column in new_positions:
+            if not board.is_free(row, column, ignore=self):
+                return False
         return True
 
     def add_square(self, square):
         self._squares.add(square)
+        self._coords = None
+        self._orientation = None
 
     def remove_square(self, square):
         """Removes square from the set of shape's squares.
         However, the square is not deleted."""
         self._squares.discard(square)
+        self._coords = None
+        self._orientation = None
 
     def delete_square_at(self, row, column):
         """Deletes square of a shape which is at position ([row], [column]).
@@ -225,8 +211,8 @@ class Shape():
 
         for square in self._squares:
             if square.coords == (row, column):
+                self.remove_square(square)
                 square.delete()
-                self._squares.discard(square)
                 break
 
     def delete(self):
@@ -259,6 +245,18 @@ class Shape():
         """Use with caution!
         Can cause problems with shape rotation."""
         self._rotation_center = list(rotation_center)
+        self._orientation = None
+
+    @property
+    def orientation(self):
+        """Index of the shape's current orientation in 'orientations' or None
+        if the shape does not match any of them."""
+        if self._orientation is None:
+            row, column = self._rotation_center
+            offsets = frozenset(Shape.shift_positions(self.coords,
+                                                      -row, -column))
+            self._orientation = orientation_index[self._type].get(offsets)
+        return self._orientation
 
     @property
     def squares(self):
@@ -266,10 +264,12 @@ class Shape():
 
     @property
     def coords(self):
-        coordinates = []
-        for shape in self._squares:
-            coordinates.append(tuple(shape.coords))
-        return coordinates
+        """Tuple of positions (row, column) of the shape's squares. It is
+        built once and shared until the shape moves, so squares should be
+        moved only by methods of the shape."""
+        if self._coords is None:
+            self._coords = tuple([square.coords for square in self._squares])
+        return self._coords
 
     @staticmethod
     def shift_positions(positions, d_row, d_column):
@@ -295,3 +295,39 @@ class Shape():
                 if (row + i, column + j) in positions:
                     new_positions.append((row + j, column - i))
         return new_positions
+
+
+def _rotations(type):
+    """Returns offsets of squares from the rotation center for all distinct
+    orientations of the shape type 'type', starting by the spawning one."""
+    offsets, (center_i, center_j), color = shape_info[type]
+    positions = Shape.shift_positions(offsets, -center_i, -center_j)
+    if type == 'O':
+        return (tuple(positions),)
+    if type == 'I':
+        # In-game rotation of 'I' shape is not a rotation in a ususal sense,
+        # it is rather a change of vertical and horizontal position.
+        # See Nintendo Rotation System for more information.
+        return (tuple(positions), tuple((j, 0) for i, j in positions))
+    # Other shapes rotate in a 3x3 box
+    result = []
+    for _ in range(4):
+        result.append(tuple(sorted(positions)))
+        positions = Shape.rotate_positions(positions, (0, 0))
+    return tuple(result)
+
+
+# Offsets of squares from the rotation center for every orientation of every
+# shape type, precomputed at import. Orientation 0 is the spawning one and
+# every rotation moves to the next one (cyclically).
+orientations = {type: _rotations(type) for type in shape_info}
+# Orientation of a shape given by the set of its squares' offsets
+orientation_index = {type: {frozenset(offsets): index
+                            for index, offsets in enumerate(orientations[type])}
+                     for type in shape_info}
+# Column shifts tried one after another when a shape rotates. In case of
+# a collision without shift, rotation is tried after moving the shape one block
+# left/right. As 'I' shape has different rotation system, in case of the wall
+# on the left, moving 2 blocks to the right has to be tried as well.
+wall_kicks = {type: (0, -1, 1, 2) if type == 'I' else (0, -1, 1)
+              for type in shape_info}
@@ -0,0 +1,210 @@
+"""In-memory snapshots of the whole state of a game, cheap enough to be taken
+every time step - for undo and rewinding, bots searching ahead and tests.
+
+A snapshot ('Snapshot') is immutable. Locked squares are stored row by row
+as rows of the planes of the board ('Board.colors' and 'Board.pieces') in
+bytes. They are taken only when locked squares have changed (a shape has
+locked, lines have been erased), see 'Board.version' - until then all the
+snapshots share them. Even then only changed rows are copied, rows equal to
+rows of the previous snapshot in place or moved down by erased lines are
+shared with it and empty rows are shared by all snapshots. On a 1000x200
+board a snapshot after a lock keeps about 34 kB instead of 1 MB of both
+planes. The same holds for the state of the random generator (packed into
+bytes), which changes only when a shape type is chosen. Cells of the active
+shape are packed into flat indices of the board ((row + hidden rows) *
+columns + column).
+So a snapshot taken every time step mostly costs only its own fields and
+the active shape. On a 20x15 board it takes 7 us (median, up to 0.12 ms when
+a shape has locked) and a ring of snapshots of a played game keeps about
+1.1 kB per snapshot including the shared parts, see 'benchmarks/snapshots.py'.
+Restoring joins the rows back into the planes and creates squares of the
+active shape only, so it takes about 0.06 ms on a 20x15 board.
+Snapshots can be restored only into games with the same board size."""
+
+import array
+import collections
+
+import square as sq
+import board as brd
+
+
+class SnapshotError(Exception): pass
+
+
+# State of a game:
+# - locked          - (color rows, piece rows) - planes of locked squares of
+#                     the board in bytes, one object per row, see '_rows',
+# - active          - (type, packed cells, rotation center) of the active
+#                     shape or None,
+# - board_version   - 'Board.version' of the board, when locked squares were
+#                     taken,
+# - random_state    - state of the random generator choosing shape types,
+# - shapes_chosen   - number of shape types chosen since seeding,
+# other fields are attributes of the game with the same names.
+Snapshot = collections.namedtuple(
+    'Snapshot', ['locked', 'active', 'next_shape_type', 'points',
+                 'deleted_lines', 'level', 'delay', 'is_game_over', 'seed',
+                 'random_state', 'shapes_chosen', 'board_version', 'size'])
+
+
+def _typecode(size):
+    """Returns array type code of cell indices of a board of [size]."""
+    no_rows, no_columns = size
+    no_cells = (no_rows + brd.Board.hidden_rows) * no_columns
+    return 'H' if no_cells <= 0x10000 else 'I'
+
+
+def _pack(shape, no_columns, typecode):
+    hidden_rows = brd.Board.hidden_rows
+    return array.array(typecode, sorted(
+        (row + hidden_rows) * no_columns + column
+        for row, column in shape.coords)).tobytes()
+
+
+def _pack_random(state):
+    # Tuple of 625 integers takes 20 kB, packed into bytes 2.5 kB
+    version, internal, gauss_next = state
+    return version, array.array('I', internal).tobytes(), gauss_next
+
+
+def _unpack_random(state):
+    version, internal, gauss_next = state
+    return version, tuple(array.array('I', internal)), gauss_next
+
+
+# Rows without locked squares by their number of columns, shared by all
+# snapshots
+_empty_rows = {}
+
+
+def _rows(board, previous=None):
+    """Returns locked squares of the [board] as (color rows, piece rows) -
+    tuples of rows of 'Board.colors' and 'Board.pieces' in bytes. Rows equal
+    to rows of [previous] (the same kind of pair) at the same place or moved
+    down by erased lines are taken from it instead of being copied."""
+    no_columns = board.no_columns
+    if no_columns not in _empty_rows:
+        _empty_rows[no_columns] = bytes(no_columns), bytes(4 * no_columns)
+    empty_colors, empty_pieces = _empty_rows[no_columns]
+    colors = memoryview(board.colors)
+    pieces = memoryview(board.pieces).cast('B')
+    previous_colors, previous_pieces = previous or ((), ())
+    moved = None        # Rows of [previous] by their contents
+    color_rows = []
+    piece_rows = []
+    for index in range(len(board.colors) // no_columns):
+        if not board.row_count(index - brd.Board.hidden_rows):
+            color_rows.append(empty_colors)
+            piece_rows.append(empty_pieces)
+            continue
+        start = index * no_columns
+        row_colors = colors[start:start + no_columns]
+        row_pieces = pieces[4 * start:4 * (start + no_columns)]
+        if (previous_pieces and previous_pieces[index] == row_pieces
+                and previous_colors[index] == row_colors):
+            color_rows.append(previous_colors[index])
+            piece_rows.append(previous_pieces[index])
+            continue
+        row = bytes(row_colors), bytes(row_pieces)
+        if moved is None:
+            moved = {row: row for row in zip(previous_colors,
+                                               previous_pieces)}
+        row = moved.get(row, row)
+        color_rows.append(row[0])
+        piece_rows.append(row[1])
+    return tuple(color_rows), tuple(piece_rows)
+
+
+def take(engine, previous=None):
+    """Returns snapshot of the [engine]. Parts, which have not changed since
+    the snapshot [previous] of the same engine, are shared with it."""
+
+    board = engine.board
+    no_columns = engine.no_columns
+    size = engine.no_rows, no_columns
+    typecode = _typecode(size)
+    active = engine.active_shape
+    if previous is not None and previous.size != size:
+        previous = None
+
+    if previous is not None and previous.board_version == board.version:
+        locked = previous.locked
+    else:
+        locked = _rows(board, previous.locked if previous is not None
+                       else None)
+
+    if (previous is not None and previous.seed == engine.seed
+            and previous.shapes_chosen == engine.shapes_chosen):
+        random_state = previous.random_state
+    else:
+        random_state = _pack_random(engine.random.getstate())
+
+    if active is not None:
+        active = (active.type, _pack(active, no_columns, typecode),
+                  tuple(active.rotation_center))
+    return Snapshot(locked, active, engine.next_shape_type, engine.points,
+                    engine.deleted_lines, engine.level, engine.delay,
+                    engine.is_game_over, engine.seed, random_state,
+                    engine.shapes_chosen, board.version, size)
+
+
+def restore(engine, snapshot):
+    """Sets the state of the [engine] to the [snapshot]."""
+
+    no_rows, no_columns = snapshot.size
+    if (no_rows, no_columns) != (engine.no_rows, engine.no_columns):
+        message = f"Snapshot of board {no_rows}x{no_columns} does not match "
+        message += f"the game board {engine.no_rows}x{engine.no_columns}."
+        raise SnapshotError(message)
+    hidden_rows = brd.Board.hidden_rows
+    typecode = _typecode(snapshot.size)
+
+    engine.clear()
+    color_rows, piece_rows = snapshot.locked
+    engine.board.set_cells(b''.join(color_rows), b''.join(piece_rows))
+    if snapshot.active is not None:
+        type, cells, rotation_center = snapshot.active
+        shape = engine.new_shape(type, empty=True)
+        for index in array.array(typecode, cells):
+            row, column = divmod(index, no_columns)
+            shape.add_square(sq.Square(engine.renderer, row - hidden_rows,
+                                       column, shape.color))
+        shape.rotation_center = rotation_center
+        engine.active_shape = shape
+
+    engine.next_shape_type = snapshot.next_shape_type
+    engine.points = snapshot.points
+    engine.deleted_lines = snapshot.deleted_lines
+    engine.level = snapshot.level
+    engine.delay = snapshot.delay
+    engine.is_game_over = snapshot.is_game_over
+    engine.seed = snapshot.seed
+    engine.random.setstate(_unpack_random(snapshot.random_state))
+    engine.shapes_chosen = snapshot.shapes_chosen
+
+
+class SnapshotRing:
+    """Last [capacity] snapshots of a game, the oldest ones are forgotten."""
+
+    def __init__(self, capacity=1000):
+        self.snapshots = collections.deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def take(self, engine):
+        """Takes snapshot of the [engine], stores it and returns it."""
+        previous = self.snapshots[-1] if self.snapshots else None
+        snapshot = take(engine, previous)
+        self.snapshots.append(snapshot)
+        return snapshot
+
+    def rewind(self, steps=1):
+        """Forgets [steps] latest snapshots and returns the snapshot, which is
+        the latest one now (None if there is none left)."""
+        for _ in range(min(steps, len(self.snapshots) - 1)):
+            self.snapshots.pop()
+        return self.snapshots[-1] if self.snapshots else None
+
+    def clear(self):
+        self.snapshots.clear()
@@ -2,32 +2,33 @@ class RowNumberOutOfLimitError(Exception): pass
 class ColumnNumberOutOfLimitError(Exception): pass
 
 
+# Positions (row, column) of all the squares, so that squares at the same
+# position share one tuple, see 'Square.coords'
+_positions = {}
+
+
 class Square:
     """Class used to handle individual squares in the active area.
-    This class is mainly used by 'Shape' class in module 'shape'."""
+    This class is mainly used by 'Shape' class in module 'shape'.
+    Squares have no instance dictionary, as there are hundreds of them in
+    every game, and their position is a tuple shared by all the squares at
+    the same position."""
+
+    __slots__ = ('renderer', '_coords', '_color')
 
     x, y = 0, 0     # Upper left corner of the area, where squares should appear
-    a = 30          # Size of squares
-    no_rows = 20    # Number of rows for the whole class, does not include
-                    # two hidden columns with number -1 and -2, where shapes
-                    # spawn
-    no_columns = 15 # Number of columns for the whole class
-
-    def __init__(self, canvas, row, column, color):
-        # Canvas, where square should show
-        self.canvas = canvas
+    a = 30          # Default size of squares, see 'render.Renderer'
+
+    def __init__(self, renderer, row, column, color):
+        # Renderer ('render.Renderer') drawing the square into a canvas.
+        # None means square is not drawn.
+        self.renderer = renderer
         Square.test_row_and_column(row, column)
-        self._row = row
-        self._column = column
+        coords = row, column
+        self._coords = _positions.setdefault(coords, coords)
         self._color = color
-
-        # Upper left and lower right corner of the square
-        x0 = Square.x + self._column * Square.a
-        y0 = Square.y + self._row * Square.a
-        x1 = x0 + Square.a
-        y1 = y0 + Square.a
-
-        self._tag = self.canvas.create_rectangle(x0, y0, x1, y1, fill=color)
+        if self.renderer is not None:
+            self.renderer.moved(self)
 
     def move_to(self, row, column):
         """Safely moves square to another position determined by [row]
@@ -35,24 +36,19 @@ class Square:
         Mainly used by row and column setters."""
 
         Square.test_row_and_column(row, column)
-        self._row = row
-        self._column = column
-
-        # Upper left and lower right corner of the square
-        x0 = Square.x + self._column * Square.a
-        y0 = Square.y + self._row * Square.a
-        x1 = x0 + Square.a
-        y1 = y0 + Square.a
-
-        self.canvas.coords(self._tag, x0, y0, x1, y1)
+        coords = row, column
+        self._coords = _positions.setdefault(coords, coords)
+        if self.renderer is not None:
+            self.renderer.moved(self)
 
     def delete(self):
         """Deletes square."""
-        self.canvas.delete(self._tag)
+        if self.renderer is not None:
+            self.renderer.deleted(self)
 
     def __str__(self):
         """Returns (row, column) of the square."""
-        return "(" + str(self._row) + "," + str(self._column) + ")"
+        return "(" + str(self.row) + "," + str(self.column) + ")"
 
     __repr__ = __str__
 
@@ -63,45 +59,46 @@ class Square:
     @color.setter
     def color(self, color):
         self._color = color
-        self.canvas.itemconfig(self._tag, fill=color)
+        if self.renderer is not None:
+            self.renderer.recolored(self)
 
     @property
     def row(self):
-        return self._row
+        return self._coords[0]
 
     @row.setter
     def row(self, row):
-        self.move_to(row, self._column)
+        self.move_to(row, self.column)
 
     @property
     def column(self):
-        return self._column
+        return self._coords[1]
 
     @column.setter
     def column(self, column):
-        self.move_to(self._row, column)
+        self.move_to(self.row, column)
 
     @property
     def coords(self):
-        return self._row, self._column
+        return self._coords
 
     @staticmethod
-    def test_row_and_column(row, column):
+    def test_row_and_column(row, column, no_rows=None, no_columns=None):
         """Testing whether row and column numbers are valid.
-        Raises exception if not."""
-        no_rows = Square.no_rows
-        no_columns = Square.no_columns
+        Raises exception if not.
+        Size of the board differs between games, so upper limits are tested
+        only if [no_rows] and [no_columns] are given, see 'board.Board'."""
         # Negative row number is valid so that shapes could spawn in a hidden area
         if row < -2 :
             message = "Negative row numbers lower than -2 are not valid. "
             message += f"Got {row}"
             raise RowNumberOutOfLimitError(message)
-        if row >= no_rows:
-            message = f"Column number {row} is over the limit ({no_rows-1})"
+        if no_rows is not None and row >= no_rows:
+            message = f"Row number {row} is over the limit ({no_rows-1})"
             raise RowNumberOutOfLimitError(message)
         if column < 0 :
             message = f"Negative column numbers are not valid. Got {column}"
             raise ColumnNumberOutOfLimitError(message)
-        if column >= no_columns:
+        if no_columns is not None and column >= no_columns:
             message = f"Column number {column} is over the limit ({no_columns-1})"
             raise ColumnNumberOutOfLimitError(message)
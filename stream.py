@@ -0,0 +1,433 @@
+"""Stream of changes of a game for spectators and remote rendering.
+
+'Encoder' turns the state of a game after every time step into a compact
+binary frame. Frames are of two kinds:
+- delta    - cells, whose piece has changed since the previous frame, new
+             pieces, pose of the active shape and stats (points, lines, level,
+             delay, next shape type, game over) if they have changed,
+- keyframe - the whole state, so that a subscriber can start watching or
+             catch up after missed frames.
+Every cell is sent with the ID of the piece of locked squares occupying it
+(see 'Board.pieces'), so that 'Decoder' rebuilds exactly the same pieces,
+which fall independently. The active shape is sent apart from them as its
+pose - type, rotation center and cells, as its squares can overlap locked
+ones (it has spawned over them, when the game is over).
+'Broadcaster' encodes every time step only once and sends the same bytes to
+all its subscribers, sending keyframes to those, which need them.
+
+Frame layout (little-endian) starts by 'frame_header' - kind, time step
+number and flags of the parts present in a delta. Numbers of cells, piece IDs
+and counts have two bytes (four on boards with more than 65535 cells).
+Delta continues by:
+- 'stats' if flag 'stats_flag' is set,
+- 'pose' - type code of the active shape (0 if there is none), its rotation
+  center (row, column), followed by count and indices of its cells if flag
+  'pose_flag' is set,
+- count, IDs and type codes (one byte) of new pieces if flag 'shapes_flag'
+  is set,
+- count, indices of changed cells (row by row starting by the hidden row -2)
+  and IDs of the pieces now occupying them (0 if free).
+Keyframe continues by number of rows and columns, 'stats', the active shape
+as in a delta, count, IDs and type codes of all the pieces, bitmap of
+occupied cells (as in 'savefile'), number of occupied cells and IDs of pieces
+occupying them."""
+
+import array
+import itertools
+import operator
+import struct
+
+import square as sq
+import shape as shp
+import board as brd
+import engine
+import savefile
+
+
+class StreamError(Exception): pass
+
+
+keyframe_kind = 0
+delta_kind = 1
+# Kind of the frame, time step number, flags
+frame_header = struct.Struct('<BIB')
+stats_flag = 1
+pose_flag = 2
+shapes_flag = 4
+# Points, deleted lines, level, delay, code of the next shape type, game over
+stats = struct.Struct('<QIIIBB')
+# Type code of the active shape, its rotation center
+pose = struct.Struct('<Bhh')
+board_size = struct.Struct('<II')
+
+
+def _word(no_cells):
+    """Returns struct format of numbers of cells and piece IDs on a board with
+    [no_cells] cells."""
+    return 'H' if no_cells < 0xffff else 'I'
+
+
+class Encoder:
+    """Encodes states of a game into frames.
+    Pieces get IDs when they first appear on the board, IDs of those, which
+    have disappeared, are reused."""
+
+    def __init__(self):
+        self.tick = 0
+        # Owners of cells in the last frame, see 'Board.cells'
+        self.owners = None
+        self.ids = {}       # Piece: its ID
+        self.codes = {}     # Piece: its type code
+        self.free_ids = []
+        self.next_id = 1
+        self.stats = None
+        self.pose = None
+        self.size = None
+        self._keyframe = None   # Keyframe of the last frame, once built
+
+    def _allocate(self, piece, previous):
+        if not self.free_ids and self.next_id > self.max_id:
+            # IDs of pieces, which had disappeared already before the previous
+            # frame, are released - decoders have deleted such pieces
+            present = set(previous) | set(self.owners)
+            for known in list(self.ids):
+                if known not in present:
+                    self.free_ids.append(self.ids.pop(known))
+                    del self.codes[known]
+        if self.free_ids:
+            id = self.free_ids.pop()
+        elif self.next_id <= self.max_id:
+            id = self.next_id
+            self.next_id += 1
+        else:
+            raise StreamError("No free piece ID left.")
+        self.ids[piece] = id
+        return id
+
+    def encode(self, game):
+        """Returns delta frame of the [game] since the previous call (the whole
+        board is new at the first call)."""
+
+        board = game.board
+        owners = board.cells()
+        if self.owners is None:
+            self.size = game.no_rows, game.no_columns
+            self.word = _word(len(owners))
+            self.max_id = 0xffff if self.word == 'H' else 0xffffffff
+            self.owners = [None] * len(owners)
+        previous = self.owners
+        self.owners = owners
+        self.tick = (self.tick + 1) & 0xffffffff
+        self._keyframe = None
+
+        # Pieces are numbers, which are equal, but not always identical
+        changed = list(itertools.compress(
+            itertools.count(), map(operator.ne, previous, owners)))
+        ids = self.ids
+        new_shapes = []
+        cell_ids = []
+        for index in changed:
+            owner = owners[index]
+            if owner is None:
+                cell_ids.append(0)
+                continue
+            id = ids.get(owner)
+            if id is None:
+                id = self._allocate(owner, previous)
+                code = self.codes[owner] = board.colors[index]
+                new_shapes.append((id, code))
+            cell_ids.append(id)
+
+        flags = 0
+        parts = []
+        game_stats = (game.points, game.deleted_lines, game.level, game.delay,
+                      shp.type_codes.get(game.next_shape_type, 0),
+                      int(game.is_game_over))
+        if game_stats != self.stats:
+            self.stats = game_stats
+            flags |= stats_flag
+            parts.append(stats.pack(*game_stats))
+        word = self.word
+        active_pose = self._pose(game)
+        if active_pose != self.pose:
+            self.pose = active_pose
+            flags |= pose_flag
+            parts.append(self._pack_pose())
+        if new_shapes:
+            flags |= shapes_flag
+            count = len(new_shapes)
+            parts.append(struct.pack(f'<{count + 1}{word}{count}B', count,
+                                     *(id for id, code in new_shapes),
+                                     *(code for id, code in new_shapes)))
+        count = len(changed)
+        parts.append(struct.pack(f'<{2 * count + 1}{word}', count, *changed,
+                                 *cell_ids))
+        return frame_header.pack(delta_kind, self.tick, flags) + b''.join(parts)
+
+    def _pose(self, game):
+        active = game.active_shape
+        if active is None:
+            return 0, 0, 0, ()
+        hidden_rows = brd.Board.hidden_rows
+        no_columns = game.no_columns
+        row, column = active.rotation_center
+        cells = tuple(sorted((square_row + hidden_rows) * no_columns
+                             + square_column
+                             for square_row, square_column in active.coords))
+        return shp.type_codes[active.type], row, column, cells
+
+    def _pack_pose(self):
+        code, row, column, cells = self.pose
+        return pose.pack(code, row, column) + struct.pack(
+            f'<{len(cells) + 1}{self.word}', len(cells), *cells)
+
+    def keyframe(self):
+        """Returns keyframe of the state encoded by the last call of
+        'encode'. It is built only once per frame."""
+
+        if self.owners is None:
+            raise StreamError("Nothing has been encoded yet.")
+        if self._keyframe is not None:
+            return self._keyframe
+        word = self.word
+        ids = self.ids
+        owners = self.owners
+        present = {owner for owner in owners if owner is not None}
+        shapes = sorted((ids[owner], self.codes[owner]) for owner in present)
+        bitmap = bytearray((len(owners) + 7) // 8)
+        cell_ids = []
+        for index, owner in enumerate(owners):
+            if owner is not None:
+                bitmap[index >> 3] |= 1 << (index & 7)
+                cell_ids.append(ids[owner])
+        count = len(shapes)
+        self._keyframe = b''.join([
+            frame_header.pack(keyframe_kind, self.tick, 0),
+            board_size.pack(*self.size),
+            stats.pack(*self.stats),
+            self._pack_pose(),
+            struct.pack(f'<{count + 1}{word}{count}B', count,
+                        *(id for id, code in shapes),
+                        *(code for id, code in shapes)),
+            bytes(bitmap),
+            struct.pack(f'<{len(cell_ids) + 1}{word}', len(cell_ids),
+                        *cell_ids)])
+        return self._keyframe
+
+
+class Decoder:
+    """Rebuilds a game from frames of 'Encoder'. Frames are applied to
+    the [game] ('engine.Engine' or its subclass) or to a new headless engine
+    created by the first keyframe, if it is None. Labels and drawing of
+    a displayed game are not updated, see 'replay.Player.play_in_game'.
+    Pieces of locked squares are numbered by their IDs."""
+
+    def __init__(self, game=None):
+        self.game = game
+        self.tick = None    # Time step of the last applied frame
+        self.codes = {}     # ID: type code of the piece
+        self.owners = None  # ID of the piece in every cell, 0 if free
+
+    def apply(self, frame):
+        """Applies [frame] and returns the game. A delta has to follow
+        the previously applied frame."""
+        kind, tick, flags = frame_header.unpack_from(frame)
+        if kind == keyframe_kind:
+            self._apply_keyframe(frame)
+        elif kind == delta_kind:
+            if self.tick is None or tick != (self.tick + 1) & 0xffffffff:
+                message = f"Delta of time step {tick} does not follow "
+                message += f"{self.tick}, a keyframe is needed."
+                raise StreamError(message)
+            self._apply_delta(frame, flags)
+        else:
+            raise StreamError(f"Unknown frame kind {kind}.")
+        self.tick = tick
+        return self.game
+
+    def _position(self, index):
+        row, column = divmod(index, self.game.no_columns)
+        return row - brd.Board.hidden_rows, column
+
+    def _apply_stats(self, frame, offset):
+        game = self.game
+        (game.points, game.deleted_lines, game.level, game.delay, next_code,
+         game_over) = stats.unpack_from(frame, offset)
+        game.next_shape_type = shp.code_types[next_code]
+        game.is_game_over = bool(game_over)
+        return offset + stats.size
+
+    def _read_pose(self, frame, offset):
+        code, row, column = pose.unpack_from(frame, offset)
+        offset += pose.size
+        word = self.word
+        count, = struct.unpack_from(f'<{word}', frame, offset)
+        offset += struct.calcsize(word)
+        cells = struct.unpack_from(f'<{count}{word}', frame, offset)
+        offset += count * struct.calcsize(word)
+        return (code, row, column, cells), offset
+
+    def _set_pose(self, active_pose):
+        """Sets the active shape, its squares and rotation center by
+        [active_pose]. Squares of a shape of the same type are moved."""
+        code, row, column, cells = active_pose
+        game = self.game
+        shape = game.active_shape
+        if shape is not None and (not code
+                                  or shape.type != shp.code_types[code]):
+            shape.delete()
+            game.active_shape = shape = None
+        if not code:
+            return
+        positions = [self._position(index) for index in cells]
+        if shape is None:
+            shape = game.new_shape(shp.code_types[code], empty=True)
+            for position in positions:
+                shape.add_square(sq.Square(game.renderer, *position,
+                                           shape.color))
+        else:
+            current = set(shape.coords)
+            self._reshape(shape, current.difference(positions),
+                          [position for position in positions
+                           if position not in current])
+        shape.rotation_center = (row, column)
+        game.active_shape = shape
+
+    def _read_shapes(self, frame, offset):
+        """Reads type codes of pieces declared in the [frame] at [offset]."""
+        word = self.word
+        size = struct.calcsize(word)
+        count, = struct.unpack_from(f'<{word}', frame, offset)
+        offset += size
+        ids = struct.unpack_from(f'<{count}{word}', frame, offset)
+        offset += count * size
+        self.codes.update(zip(ids, frame[offset:offset + count]))
+        return offset + count
+
+    def _apply_keyframe(self, frame):
+        offset = frame_header.size
+        no_rows, no_columns = board_size.unpack_from(frame, offset)
+        offset += board_size.size
+        game = self.game
+        if game is None:
+            game = self.game = engine.Engine(no_rows, no_columns)
+        elif (no_rows, no_columns) != (game.no_rows, game.no_columns):
+            message = f"Streamed board {no_rows}x{no_columns} does not match "
+            message += f"the game board {game.no_rows}x{game.no_columns}."
+            raise StreamError(message)
+        no_cells = (no_rows + brd.Board.hidden_rows) * no_columns
+        self.word = word = _word(no_cells)
+        game.clear()
+
+        offset = self._apply_stats(frame, offset)
+        active_pose, offset = self._read_pose(frame, offset)
+        self.codes = {}
+        offset = self._read_shapes(frame, offset)
+        bitmap = frame[offset:offset + (no_cells + 7) // 8]
+        offset += len(bitmap)
+        count, = struct.unpack_from(f'<{word}', frame, offset)
+        offset += struct.calcsize(word)
+        ids = struct.unpack_from(f'<{count}{word}', frame, offset)
+
+        self.owners = owners = [0] * no_cells
+        colors = bytearray(no_cells)
+        pieces = array.array('I', bytes(4 * no_cells))
+        occupied = 0
+        for byte_index, byte in enumerate(bitmap):
+            if not byte:
+                continue
+            for bit in savefile.byte_bits[byte]:
+                index = byte_index * 8 + bit
+                id = owners[index] = ids[occupied]
+                colors[index] = self.codes[id]
+                pieces[index] = id
+                occupied += 1
+        game.board.set_cells(colors, pieces.tobytes())
+        self._set_pose(active_pose)
+
+    def _apply_delta(self, frame, flags):
+        word = self.word
+        size = struct.calcsize(word)
+        offset = frame_header.size
+        if flags & stats_flag:
+            offset = self._apply_stats(frame, offset)
+        active_pose = None
+        if flags & pose_flag:
+            active_pose, offset = self._read_pose(frame, offset)
+        if flags & shapes_flag:
+            offset = self._read_shapes(frame, offset)
+        count, = struct.unpack_from(f'<{word}', frame, offset)
+        offset += size
+        indices = struct.unpack_from(f'<{count}{word}', frame, offset)
+        ids = struct.unpack_from(f'<{count}{word}', frame, offset + count * size)
+
+        board = self.game.board
+        owners = self.owners
+        freed = []      # Cells, which are not locked anymore
+        locked = {}     # ID: positions of its locked squares
+        for index, id in zip(indices, ids):
+            position = self._position(index)
+            owners[index] = id
+            if id:
+                locked.setdefault(id, []).append(position)
+            elif board.colors[index]:
+                freed.append(position)
+        if freed:
+            board.free(freed)
+        for id, positions in locked.items():
+            board.lock(positions, self.codes[id], id)
+        if active_pose is not None:
+            self._set_pose(active_pose)
+
+    def _reshape(self, shape, removed, added):
+        """Moves squares of the [shape] from positions [removed] to positions
+        [added], creating or deleting squares as needed."""
+        game = self.game
+        spare = [square for square in shape.squares
+                 if square.coords in removed]
+        for square in spare:
+            shape.remove_square(square)
+        for position in added:
+            if spare:
+                square = spare.pop()
+                square.move_to(*position)
+            else:
+                square = sq.Square(game.renderer, *position, shape.color)
+            shape.add_square(square)
+        for square in spare:
+            square.delete()
+
+
+class Broadcaster:
+    """Sends frames of a game to many subscribers. Every time step is encoded
+    only once. Subscribers get a keyframe when they subscribe, every
+    [keyframe_interval] time steps and after they have missed a frame."""
+
+    def __init__(self, keyframe_interval=100):
+        self.keyframe_interval = keyframe_interval
+        self.encoder = Encoder()
+        # Function sending a frame: whether it needs a keyframe. Functions
+        # return False if the frame could not be sent, e.g. the subscriber
+        # is too slow.
+        self.subscribers = {}
+
+    def subscribe(self, send):
+        self.subscribers[send] = True
+
+    def unsubscribe(self, send):
+        self.subscribers.pop(send, None)
+
+    def publish(self, game):
+        """Sends the state of the [game] to all the subscribers. Nothing is
+        encoded if there are none."""
+        if not self.subscribers:
+            return
+        encoder = self.encoder
+        delta = encoder.encode(game)
+        periodic = encoder.tick % self.keyframe_interval == 0
+        for send, needs_keyframe in self.subscribers.items():
+            if needs_keyframe or periodic:
+                frame = encoder.keyframe()
+            else:
+                frame = delta
+            self.subscribers[send] = not send(frame)
@@ -0,0 +1,68 @@
+import unittest
+
+import board as brd
+import engine
+import shape as shp
+
+
+class SpawnTest(unittest.TestCase):
+
+    def test_shapes_spawn_inside_narrowest_board(self):
+        game = engine.Engine(8, brd.Board.min_columns, seed=0)
+        for type in shp.shape_info:
+            shape = game.new_shape(type, j0=game.spawn_column)
+            for row, column in shape.coords:
+                self.assertTrue(0 <= column < game.no_columns,
+                                f"{type} spawns at column {column}")
+
+    def test_shape_locks_on_narrowest_board(self):
+        game = engine.Engine(8, brd.Board.min_columns, seed=0)
+        game.active_shape = game.new_shape('I', j0=game.spawn_column)
+        game.press('space')
+        for _ in range(3):
+            game.time_step()
+        self.assertEqual(game.board.row_masks()[-1], 0)
+        self.assertEqual(game.deleted_lines, 1)
+
+    def spawn_over(self, positions):
+        """Returns game after the I shape has spawned over locked squares at
+        [positions]."""
+        game = engine.Engine(20, 15, seed=0)
+        game.active_shape = None
+        for position in positions:
+            game.board.lock([position], shp.type_codes['T'])
+        game.next_shape_type = 'I'
+        game.time_step()
+        return game
+
+    def test_shape_spawning_over_hidden_squares_moves_through(self):
+        column = engine.Engine(20, 15).spawn_column + 1
+        game = self.spawn_over([(-1, column)])
+        self.assertFalse(game.is_game_over)
+        self.assertEqual(sorted(game.active_shape.coords),
+                         [(0, column - 1 + offset) for offset in range(4)])
+        self.assertEqual(game.board.code_at(-1, column), shp.type_codes['T'])
+
+    def test_shape_unable_to_move_down_after_spawn_ends_game(self):
+        column = engine.Engine(20, 15).spawn_column + 1
+        game = self.spawn_over([(0, column)])
+        self.assertTrue(game.is_game_over)
+
+
+class PointsTest(unittest.TestCase):
+
+    def test_more_than_four_lines_at_once(self):
+        for no_lines in 5, 8, 17:
+            game = engine.Engine(20, 15, seed=0)
+            for row in range(game.no_rows - no_lines, game.no_rows):
+                game.board.lock([(row, column)
+                                 for column in range(game.no_columns)],
+                                shp.type_codes['I'])
+            self.assertEqual(game.erase_full_lines(), no_lines)
+            self.assertEqual(game.deleted_lines, no_lines)
+            self.assertEqual(game.points, 1200)
+            self.assertFalse(game.board.piece_cells())
+
+
+if __name__ == '__main__':
+    unittest.main()
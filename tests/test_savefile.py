@@ -0,0 +1,90 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import engine
+import savefile
+import shape as shp
+
+
+def state(game):
+    active = game.active_shape
+    return (bytes(game.board.colors), bytes(game.board.pieces),
+            None if active is None else (active.type, sorted(active.coords)),
+            game.points, game.deleted_lines, game.next_shape_type,
+            game.is_game_over)
+
+
+class RejectedLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.game = engine.Engine(20, 15, seed=1)
+        for key in ['Left', 'space', 'Right', 'Right', 'space', 'space']:
+            self.game.press(key)
+            self.game.time_step()
+        self.game.points = 123
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data):
+        filename = os.path.join(self.directory, 'game.tet')
+        with open(filename, 'wb') as file:
+            file.write(data)
+        return filename
+
+    def assert_rejected(self, data, error=Exception):
+        before = state(self.game)
+        self.assertTrue(self.game.board.piece_cells())
+        with self.assertRaises(error):
+            self.game.load(self.write(data))
+        self.assertEqual(state(self.game), before)
+
+    def test_other_board_size(self):
+        other = engine.Engine(30, 10, seed=2)
+        other.time_step()
+        self.assert_rejected(savefile.dumps(other),
+                             savefile.UnknownSaveFormatError)
+
+    def test_other_version(self):
+        data = bytearray(savefile.dumps(self.game))
+        data[len(savefile.magic)] = savefile.version + 1
+        self.assert_rejected(bytes(data), savefile.UnknownSaveFormatError)
+
+    def test_truncated_binary(self):
+        data = savefile.dumps(self.game)
+        for size in (len(savefile.magic) + 1, savefile.header.size,
+                     len(data) - 1):
+            self.assert_rejected(data[:size], savefile.UnknownSaveFormatError)
+
+    def test_unknown_type_code(self):
+        data = bytearray(savefile.dumps(self.game))
+        fields = list(savefile.header.unpack_from(data))
+        fields[6] = len(shp.code_types)
+        data[:savefile.header.size] = savefile.header.pack(*fields)
+        self.assert_rejected(bytes(data), savefile.UnknownSaveFormatError)
+
+    def test_truncated_text(self):
+        text = savefile.dumps_text(self.game)
+        self.assert_rejected(text[:len(text) // 3].encode())
+
+    def test_text_outside_board(self):
+        text = savefile.dumps_text(self.game) + 'T\n30 0\n30 1\n'
+        self.assert_rejected(text.encode())
+
+    def test_bad_magic(self):
+        self.assert_rejected(b'TETX' + savefile.dumps(self.game)[4:])
+
+    def test_valid_load_after_rejected_one(self):
+        saved = engine.Engine(20, 15, seed=3)
+        saved.time_step()
+        self.assert_rejected(savefile.dumps(self.game)[:-1])
+        self.game.load(self.write(savefile.dumps(saved)))
+        self.assertEqual(state(self.game), state(saved))
+
+
+if __name__ == '__main__':
+    unittest.main()
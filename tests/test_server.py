@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+
+import server
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = server.Server()
+        self.listener = await asyncio.start_server(self.server.handle,
+                                                   '127.0.0.1', 0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def connect(self):
+        return await asyncio.open_connection('127.0.0.1', self.port)
+
+    async def ask(self, connection, line):
+        reader, writer = connection
+        writer.write(line.encode() + b'\n')
+        await writer.drain()
+        return (await reader.readline()).decode().strip()
+
+    async def test_owner_disconnects_after_other_client_closed_session(self):
+        owner = await self.connect()
+        other = await self.connect()
+        self.assertEqual(await self.ask(owner, 'new 0'), 'ok 1')
+        self.assertEqual(await self.ask(owner, 'new 0'), 'ok 2')
+        self.assertEqual(await self.ask(other, 'close 1'), 'ok')
+
+        loop = asyncio.get_running_loop()
+        errors = []
+        loop.set_exception_handler(lambda loop, context: errors.append(
+            context))
+        owner[1].close()
+        self.assertEqual(await owner[0].read(), b'')
+        for _ in range(10):
+            if not self.server.sessions:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(errors, [])
+        # The owner's other session is closed with the connection
+        self.assertEqual(self.server.sessions, {})
+        other[1].close()
+
+
+if __name__ == '__main__':
+    unittest.main()
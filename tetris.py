@@ -1,14 +1,38 @@
 __author__ = 'Andrej Uhliarik'
 
+import argparse
 import tkinter as tk
 import tkinter.filedialog
 
 from tkinter import font as tkfont
 
+import assets
+import autosave
 import game
+import gravity
+import instrument
+import replay
 
 class Program:
-    def __init__(self):
+    def __init__(self, no_rows=20, no_columns=15, record=None,
+                 replay_log=None, stats=None, autosave_directory=None,
+                 autosave_interval=30, autosave_keep=5,
+                 gravity_mode='fragments'):
+        """Opens the window of the game with board [no_rows]x[no_columns].
+        Events of the game are appended to the log [record] if given and log
+        [replay_log] is replayed on the board of the log instead of playing
+        if given, see module 'replay'. If [stats] is given, durations of
+        game's methods are measured and written into it on exit, see module
+        'instrument'.
+        If [autosave_directory] is given, the game is saved there every
+        [autosave_interval] seconds keeping [autosave_keep] last saves, see
+        module 'autosave'. Locked squares fall after erasing lines according
+        to [gravity_mode], see module 'gravity'."""
+        player = None
+        if replay_log is not None:
+            player = replay.Player(replay_log)
+            no_rows, no_columns = player.size
+
         # Main window
         self.window = tk.Tk()
         self.window.title("Tetris")
@@ -30,7 +54,8 @@ class Program:
         self.next_shape_canvas.grid(row=1, padx=20, pady=0)
 
         # At this point game object can be created
-        self.game = game.Game(self, self.window, self.next_shape_canvas)
+        self.game = game.Game(self, self.window, self.next_shape_canvas,
+                              no_rows, no_columns, gravity_mode=gravity_mode)
 
         # Labels with number of points and number of deleted lines displayed
         font = tkfont.Font(family='Helvetica', size=16, weight='bold')
@@ -72,22 +97,48 @@ class Program:
         self.load_game_button.grid(row=7, pady=5)
 
         # 'Pause'/'Play' buton
-        self.pause_image = tk.PhotoImage(file='pause.png')
-        self.play_image = tk.PhotoImage(file='play.png')
+        # Image 'Play' is not needed until the game is paused, so it is read
+        # after the window is shown, together with game over animation
+        self.pause_image = assets.cache.image('pause.png')
         self.pause_button = tk.Button(self.toolbar, width=100, height=70,
                                       image=self.pause_image,
                                       command=self.pause_unpause)
         self.pause_button.grid(row=8, padx=20, pady=15)
 
+        if record is not None:
+            self.game.start_recording(record)
+        if stats is not None:
+            self.instrumentation = instrument.Instrumentation()
+            self.instrumentation.attach(self.game)
+            self.instrumentation.dump_at_exit(stats)
+        self.autosaver = None
+        if autosave_directory is not None:
+            self.autosaver = autosave.Autosaver(self.game, autosave_directory,
+                                                autosave_interval,
+                                                autosave_keep)
+            self.autosaver.start()
+        self.window.protocol('WM_DELETE_WINDOW', self.quit)
         self.game.run()
+        self.window.after_idle(assets.cache.prefetch,
+                               ['play.png', game.Game.game_over_sheet],
+                               self.window)
+        if player is not None:
+            self.pause_button.config(state='disabled')
+            player.play_in_game(self.game)
         self.window.mainloop()
 
 
+    def quit(self):
+        """Closes the window, after the last autosave has been written."""
+        if self.autosaver is not None:
+            self.autosaver.close()
+        self.window.destroy()
+
     def pause_unpause(self):
         if not self.game.paused:
             self.game.pause()
             self.game.unbind_keys()
-            self.pause_button.config(image=self.play_image)
+            self.pause_button.config(image=assets.cache.image('play.png'))
         else:
             self.game.run()
             self.game.bind_keys()
@@ -111,6 +162,7 @@ class Program:
         text += "down - speeds up falling of the shape\n"
         text += "up - rotates shape by 90 degrees\n"
         text += "space - forces shape to immediately land\n"
+        text += "backspace - returns the game back in time\n"
         font = tkfont.Font(family='Helvetica', size=14)
         label = tk.Label(self.popup, text=text, font=font)
         label.grid(row=0, padx=10, pady=2)
@@ -212,4 +264,27 @@ class Program:
         self.pause_unpause()
 
 
-Program()
+parser = argparse.ArgumentParser(description="Tetris")
+parser.add_argument('--rows', type=int, default=20,
+                    help="number of rows of the board")
+parser.add_argument('--columns', type=int, default=15,
+                    help="number of columns of the board")
+parser.add_argument('--gravity', choices=gravity.modes, default='fragments',
+                    help="how blocks fall after lines are erased - parts of "
+                         "shapes on their own or rows as a whole (naive)")
+parser.add_argument('--record', metavar='LOG',
+                    help="append events of the game to the log")
+parser.add_argument('--replay', metavar='LOG', help="replay the log")
+parser.add_argument('--stats', metavar='FILE',
+                    help="write durations of game's methods on exit (JSON)")
+parser.add_argument('--autosave', metavar='DIRECTORY',
+                    help="save the game periodically into the directory")
+parser.add_argument('--autosave-interval', type=float, default=30,
+                    metavar='SECONDS', help="time between autosaves")
+parser.add_argument('--autosave-keep', type=int, default=5, metavar='N',
+                    help="number of autosaves kept")
+args = parser.parse_args()
+Program(args.rows, args.columns, record=args.record, replay_log=args.replay,
+        stats=args.stats, autosave_directory=args.autosave,
+        autosave_interval=args.autosave_interval,
+        autosave_keep=args.autosave_keep, gravity_mode=args.gravity)